@@ -0,0 +1,78 @@
+from flask import current_app, request
+
+MAX_BATCH_SIZE = 500
+
+
+class BatchError(ValueError):
+    """
+    Raised when a batch request body is malformed
+    """
+
+
+def parse_batch(key):
+    """
+    Reads the list of items under `key` from the JSON body
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get(key)
+    if not isinstance(items, list) or not items:
+        raise BatchError(f'Se esperaba una lista no vacía en "{key}"')
+    if len(items) > MAX_BATCH_SIZE:
+        raise BatchError(f'Como máximo {MAX_BATCH_SIZE} elementos por petición')
+    if not all(isinstance(item, dict) for item in items):
+        raise BatchError(f'Cada elemento de "{key}" debe ser un objeto')
+    return items
+
+
+def parse_batch_ids():
+    """
+    Reads the list of ids to delete from the JSON body
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise BatchError('Se esperaba una lista no vacía en "ids"')
+    if len(ids) > MAX_BATCH_SIZE:
+        raise BatchError(f'Como máximo {MAX_BATCH_SIZE} elementos por petición')
+    if not all(isinstance(item_id, int) and not isinstance(item_id, bool) for item_id in ids):
+        raise BatchError('Los ids deben ser enteros')
+    return ids
+
+
+def failed_batch(action):
+    """
+    Response for a batch whose transaction failed. The cause is logged,
+    not returned, so database errors don't reach the client.
+    """
+    current_app.logger.exception('Error al %s', action)
+    return {'message': f'Error al {action}'}, 500
+
+
+def missing_fields(item, required):
+    return [field for field in required if not item.get(field)]
+
+
+class BatchResults:
+    """
+    Per-item outcome of a batch request, reported in input order
+    """
+
+    def __init__(self, size):
+        self.results = [None] * size
+
+    def ok(self, index, status, **payload):
+        self.results[index] = {'index': index, 'status': status, **payload}
+
+    def error(self, index, status, message):
+        self.results[index] = {'index': index, 'status': status, 'message': message}
+
+    def pending(self):
+        return [index for index, result in enumerate(self.results) if result is None]
+
+    def response(self):
+        failed = sum(1 for result in self.results if result['status'] >= 400)
+        return {
+            'results': self.results,
+            'succeeded': len(self.results) - failed,
+            'failed': failed
+        }, 200
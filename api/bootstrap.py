@@ -0,0 +1,103 @@
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from api.app import db, hasher
+from api.db_routing import using_primary
+
+# Name of the MySQL advisory lock that serializes concurrent bootstraps
+BOOTSTRAP_LOCK = 'svaia_api_bootstrap'
+BOOTSTRAP_LOCK_TIMEOUT = 30
+
+DEFAULT_USERS = (
+    {
+        'nombre': 'Administrador',
+        'apellidos': 'Sistema',
+        'correo': 'admin@example.com',
+        'username': 'admin',
+        'password': 'Admin123!',
+        'is_admin': True,
+    },
+    {
+        'nombre': 'Usuario',
+        'apellidos': 'Normal',
+        'correo': 'user@example.com',
+        'username': 'user',
+        'password': 'User123!',
+        'is_admin': False,
+    },
+)
+
+
+@contextmanager
+def bootstrap_lock():
+    """
+    Cross-process lock around schema creation and seeding, so that workers
+    started at the same time don't race each other. Only MySQL has one;
+    other databases run unlocked.
+    """
+    if db.engine.dialect.name != 'mysql':
+        yield
+        return
+
+    with db.engine.connect() as connection:
+        acquired = connection.execute(
+            text('SELECT GET_LOCK(:name, :timeout)'),
+            {'name': BOOTSTRAP_LOCK, 'timeout': BOOTSTRAP_LOCK_TIMEOUT}
+        ).scalar()
+        if not acquired:
+            raise RuntimeError('No se pudo obtener el bloqueo de inicialización de la base de datos')
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT RELEASE_LOCK(:name)'), {'name': BOOTSTRAP_LOCK})
+
+
+def bootstrap_database():
+    """
+    Creates the tables and the default users if they don't exist.
+    Idempotent; must run inside an application context.
+    """
+    from api.models.user import User
+    from api.models.project import Project
+    from api.models.message import Message
+
+    with bootstrap_lock():
+        # Only the primary: the replica gets its schema through replication
+        db.create_all(bind_key=None)
+
+        # Create default users if they don't exist
+        existing = {
+            username for (username,) in db.session.query(User.username).filter(
+                User.username.in_([seed['username'] for seed in DEFAULT_USERS])
+            )
+        }
+        for seed in DEFAULT_USERS:
+            if seed['username'] in existing:
+                continue
+            fields = dict(seed)
+            fields['password'] = hasher.hash_password(fields['password'])  # Hash with Praetorian
+            db.session.add(User(**fields))
+
+        db.session.commit()
+
+
+def init_lazily(app):
+    """
+    Defers bootstrap_database to the first request served by this process
+    """
+    lock = threading.Lock()
+    done = False
+
+    @app.before_request
+    def bootstrap_once():
+        nonlocal done
+        if done:
+            return
+        with lock:
+            if not done:
+                # This may be a GET, which would otherwise read from the replica
+                with using_primary():
+                    bootstrap_database()
+                done = True
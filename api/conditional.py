@@ -0,0 +1,39 @@
+import hashlib
+from flask import request
+
+
+def make_etag(*parts):
+    """
+    Opaque validator built from the values that determine a representation
+    """
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def row_etag(row, *scope):
+    """
+    Validator of a single row: it changes with every update of the row,
+    which bumps its version even within the same second
+    """
+    return make_etag(type(row).__name__, row.id, row.version, row.fecha_modificacion, request.query_string, *scope)
+
+
+def page_etag(model, items, next_cursor, *scope):
+    """
+    Validator of one page of a list, from the rows the page query already
+    returned: their ids and versions catch insertions, deletions and edits
+    within the page, and next_cursor rows added after its end
+    """
+    rows = ','.join(f'{item.id}:{item.version}' for item in items)
+    return make_etag(model.__name__, rows, next_cursor, request.query_string, *scope)
+
+
+def is_not_modified(etag):
+    return request.if_none_match.contains(etag)
+
+
+def not_modified(etag):
+    return '', 304, etag_header(etag)
+
+
+def etag_header(etag):
+    return {'ETag': f'"{etag}"'}
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+class PoolTelemetry:
+    """
+    Counters of the SQLAlchemy connection pool: checkouts, time spent
+    waiting for a free connection, checkouts served from overflow and
+    connections invalidated (e.g. stale ones detected by pre-ping).
+    """
+
+    def __init__(self):
+        self.engine = None
+        self._lock = threading.Lock()
+        self._counters = {
+            'checkouts': 0,
+            'checkins': 0,
+            'connects': 0,
+            'invalidations': 0,
+            'soft_invalidations': 0,
+            'overflow_checkouts': 0,
+            'timeouts': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+        }
+
+    def _increment(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def attach(self, engine):
+        self.engine = engine
+        engine.pool.telemetry = self
+        event.listen(engine.pool, 'connect', lambda *args: self._increment('connects'))
+        event.listen(engine.pool, 'checkout', lambda *args: self._increment('checkouts'))
+        event.listen(engine.pool, 'checkin', lambda *args: self._increment('checkins'))
+        event.listen(engine.pool, 'invalidate', lambda *args: self._increment('invalidations'))
+        event.listen(engine.pool, 'soft_invalidate', lambda *args: self._increment('soft_invalidations'))
+
+    def record_wait(self, elapsed, overflow=False, timed_out=False):
+        with self._lock:
+            self._counters['wait_time'] += elapsed
+            self._counters['max_wait_time'] = max(self._counters['max_wait_time'], elapsed)
+            if overflow:
+                self._counters['overflow_checkouts'] += 1
+            if timed_out:
+                self._counters['timeouts'] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        waits = counters['checkouts'] + counters['timeouts']
+        counters['avg_wait_time'] = counters['wait_time'] / waits if waits else 0.0
+        # Read through the engine: dispose() replaces its pool
+        pool = self.engine.pool if self.engine is not None else None
+        if isinstance(pool, QueuePool):
+            counters['size'] = pool.size()
+            counters['checked_out'] = pool.checkedout()
+            counters['overflow'] = pool.overflow()
+        return counters
+
+
+# One per engine: the primary database and, if configured, the read replica
+pool_telemetry = PoolTelemetry()
+replica_pool_telemetry = PoolTelemetry()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection
+    in the telemetry attached to it
+    """
+
+    telemetry = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.telemetry is not None:
+                self.telemetry.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        if self.telemetry is not None:
+            self.telemetry.record_wait(time.perf_counter() - start, overflow=self.overflow() > 0)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
+
+
+def engine_options(database_url):
+    """
+    SQLAlchemy engine options read from the environment.
+    SQLite keeps its own pool, so the sizing options only apply to server databases.
+    """
+    if database_url.startswith('sqlite'):
+        return {}
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Below MySQL's wait_timeout
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', 'true'),
+    }
+
+
+def dispose_after_fork(engine):
+    """
+    Gives each forked process (e.g. gunicorn workers forked from a preloaded
+    master) a fresh pool, instead of sharing the parent's open connections.
+    The parent's connections are left open for the parent to use.
+    """
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
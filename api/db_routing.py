@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+# Bind key of the read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+# Requests that only read, and may be served from the replica
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# After a write, the writer reads from the primary for this many seconds,
+# which must cover the replication lag
+STICKY_SECONDS = float(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+# Responses to writes carry the time (Unix seconds) until which the caller
+# must read from the primary; callers send it back on their next requests.
+# The state travels with the caller, so it holds whichever worker or
+# instance serves the next request.
+STICKY_HEADER = 'X-DB-Sticky-Until'
+
+_counters = {'replica': 0, 'primary': 0, 'sticky_requests': 0}
+_counters_lock = threading.Lock()
+
+
+def sticky_requested():
+    """
+    Whether the request carries a sticky-until time that hasn't passed yet
+    """
+    try:
+        sticky = float(request.headers.get(STICKY_HEADER, 0)) > time.time()
+    except ValueError:
+        return False
+    if sticky:
+        with _counters_lock:
+            _counters['sticky_requests'] += 1
+    return sticky
+
+
+def reads_from_replica():
+    """
+    Read-only requests go to the replica unless the caller wrote recently.
+    Decided once per request.
+    """
+    if not has_request_context():
+        return False
+    if 'db_read_replica' not in g:
+        g.db_read_replica = request.method in READ_METHODS and not sticky_requested()
+    return g.db_read_replica
+
+
+@contextmanager
+def using_primary():
+    """
+    Routes every statement of the block to the primary, e.g. for writes
+    issued while handling a GET
+    """
+    if not has_request_context():
+        yield
+        return
+
+    previous = g.get('db_read_replica')
+    g.db_read_replica = False
+    try:
+        yield
+    finally:
+        if previous is None:
+            g.pop('db_read_replica', None)
+        else:
+            g.db_read_replica = previous
+
+
+class RoutingSession(Session):
+    """
+    Session that sends the statements of read-only requests to the read
+    replica and everything else (writes, flushes, write requests) to the
+    primary. Without a replica bind every statement goes to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engines = self._db.engines
+        if (bind is None and REPLICA_BIND in engines and not self._flushing
+                and not (self.new or self.dirty or self.deleted) and reads_from_replica()):
+            target = 'replica'
+            bind = engines[REPLICA_BIND]
+        else:
+            target = 'primary'
+
+        with _counters_lock:
+            _counters[target] += 1
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def mark_writer_sticky(session):
+    """
+    after_commit hook: the caller of a write request is told to read its
+    own writes from the primary for the next STICKY_SECONDS
+    """
+    if has_request_context() and request.method not in READ_METHODS:
+        g.db_sticky_until = time.time() + STICKY_SECONDS
+
+
+def add_sticky_header(response):
+    """
+    after_request hook that hands the sticky-until time to the caller
+    """
+    until = g.get('db_sticky_until')
+    if until is not None:
+        response.headers[STICKY_HEADER] = f'{until:.3f}'
+    return response
+
+
+def stats():
+    with _counters_lock:
+        counters = dict(_counters)
+    counters['sticky_seconds'] = STICKY_SECONDS
+    return counters
@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_praetorian import Praetorian
+from flask_praetorian.exceptions import AuthenticationError
+
+
+class HashingPoolBusy(Exception):
+    """
+    Raised when the password hashing pool is saturated
+    """
+
+    def __init__(self, retry_after):
+        super().__init__('El servicio de contraseñas está saturado')
+        self.retry_after = retry_after
+
+
+def busy_response(error):
+    """
+    Flask-RESTful response for a saturated hashing pool
+    """
+    return (
+        {'message': 'Servicio ocupado, inténtalo de nuevo en unos segundos'},
+        503,
+        {'Retry-After': str(error.retry_after)}
+    )
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a bounded worker pool.
+
+    The calling request thread still waits for the result; what the pool
+    bounds is how many KDFs run at once. The KDFs used by Praetorian
+    (pbkdf2, bcrypt, argon2) release the GIL while they work, so the pool
+    gives real parallelism, and other requests on the worker keep being
+    served meanwhile. At most max_pending operations may be running or
+    queued; past that, callers wait up to queue_timeout seconds and then
+    get HashingPoolBusy instead of piling up.
+    """
+
+    def __init__(self):
+        self.guard = None
+        self.max_workers = 4
+        self.max_pending = 16
+        self.queue_timeout = 0.5
+        self.retry_after = 1
+        self._executor = None
+        self._executor_pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._counters = {
+            'operations': 0,
+            'hash_time': 0.0,
+            'queue_time': 0.0,
+            'rejected': 0,
+            'in_flight': 0,
+        }
+
+    def init_app(self, app, guard):
+        self.guard = guard
+        self.max_workers = app.config.get('PASSWORD_HASH_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.queue_timeout = app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', self.queue_timeout)
+        self.retry_after = app.config.get('PASSWORD_HASH_RETRY_AFTER', self.retry_after)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+        # Cost of newly hashed passwords; existing hashes keep their own cost
+        rounds = app.config.get('PASSWORD_HASH_ROUNDS')
+        if rounds:
+            scheme = guard.pwd_ctx.default_scheme()
+            guard.pwd_ctx.update(**{f'{scheme}__default_rounds': int(rounds)})
+
+    @property
+    def executor(self):
+        # Worker threads don't survive fork(), so each process builds its own pool
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='password-hash'
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _submit(self, function, *args):
+        """
+        Queues an operation on the pool and returns its future.
+        Raises HashingPoolBusy if no pending slot frees up in time.
+        """
+        queued_at = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise HashingPoolBusy(self.retry_after)
+
+        def timed():
+            started_at = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                finished_at = time.perf_counter()
+                with self._lock:
+                    self._counters['operations'] += 1
+                    self._counters['hash_time'] += finished_at - started_at
+                    self._counters['queue_time'] += started_at - queued_at
+
+        with self._lock:
+            self._counters['in_flight'] += 1
+        try:
+            future = self.executor.submit(timed)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future=None):
+        with self._lock:
+            self._counters['in_flight'] -= 1
+        self._slots.release()
+
+    def _run(self, function, *args):
+        """
+        Runs the operation on the pool and blocks the caller until it is done
+        """
+        return self._submit(function, *args).result()
+
+    def hash_password(self, raw_password):
+        return self._run(self.guard.hash_password, raw_password)
+
+    def hash_many(self, raw_passwords):
+        """
+        Hashes several passwords in parallel, in input order.
+        At most one operation per worker is queued at a time, so a large
+        batch leaves pending slots free for logins running meanwhile.
+        """
+        in_flight = threading.BoundedSemaphore(self.max_workers)
+        futures = []
+        try:
+            for raw_password in raw_passwords:
+                in_flight.acquire()
+                future = self._submit(self.guard.hash_password, raw_password)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+        except HashingPoolBusy:
+            in_flight.release()
+            for future in futures:
+                future.cancel()
+            raise
+        return [future.result() for future in futures]
+
+    def verify_password(self, raw_password, hashed_password):
+        return self._run(self.guard.pwd_ctx.verify, raw_password, hashed_password)
+
+    def authenticate(self, username, password):
+        """
+        guard.authenticate, whose password check PooledPraetorian runs on
+        the pool. Returns the user, or None if the credentials are wrong.
+        """
+        try:
+            return self.guard.authenticate(username, password)
+        except AuthenticationError:
+            return None
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        operations = counters['operations']
+        counters['avg_hash_time'] = counters['hash_time'] / operations if operations else 0.0
+        counters['avg_queue_time'] = counters['queue_time'] / operations if operations else 0.0
+        counters['workers'] = self.max_workers
+        counters['max_pending'] = self.max_pending
+        return counters
+
+
+class PooledPraetorian(Praetorian):
+    """
+    Praetorian whose password checks run on the hasher's pool. Everything
+    else about authentication (user lookup, hash auto-update) stays in
+    Praetorian.
+    """
+
+    def __init__(self, hasher, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hasher = hasher
+
+    def _verify_password(self, raw_password, hashed_password):
+        return self.hasher.verify_password(raw_password, hashed_password)
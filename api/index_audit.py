@@ -0,0 +1,73 @@
+from sqlalchemy import text
+from api.app import db
+
+
+def audited_queries():
+    """
+    One representative statement per access path of the API resources.
+    Each entry is (name, query, expected_scan): listings that read a whole
+    table on purpose are marked so they are reported but not flagged.
+    """
+    from api.models.user import User
+    from api.models.project import Project
+    from api.models.message import Message
+
+    return [
+        ('User.lookup / get_by_username', User.query.filter_by(username='admin'), False),
+        ('User.get_by_email', User.query.filter_by(correo='admin@example.com'), False),
+        ('User.identify', User.query.filter_by(id=1), False),
+        ('UserListResource.get', User.query.order_by(User.id).limit(100), True),
+        ('ProjectListResource.get (usuario)',
+         Project.query.filter_by(usuario_id=1).order_by(Project.id).limit(100), False),
+        ('ProjectListResource.get (admin)', Project.query.order_by(Project.id).limit(100), True),
+        ('ProjectResource.get', Project.query.filter_by(id=1), False),
+        ('ProjectMessageListResource.get',
+         Message.query.filter_by(proyecto_id=1).order_by(
+             Message.fecha_creacion.desc(), Message.id.desc()).limit(50), False),
+    ]
+
+
+def explain(query):
+    """
+    Runs the database's EXPLAIN for a query.
+    Returns the plan as text lines and whether it reads a whole table.
+    """
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'mysql':
+        rows = [dict(row._mapping) for row in db.session.execute(text(f'EXPLAIN {sql}'))]
+        plan = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in rows]
+        full_scan = any(row['type'] == 'ALL' for row in rows)
+    elif dialect.name == 'sqlite':
+        details = [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+        plan = details
+        full_scan = any(detail.startswith('SCAN') and 'INDEX' not in detail for detail in details)
+    elif dialect.name == 'postgresql':
+        plan = [row[0] for row in db.session.execute(text(f'EXPLAIN {sql}'))]
+        full_scan = any('Seq Scan' in line for line in plan)
+    else:
+        raise RuntimeError(f'EXPLAIN no soportado para {dialect.name}')
+
+    return plan, full_scan
+
+
+def audit_indexes():
+    """
+    Explains every audited query. Returns the report lines and the names
+    of the queries that unexpectedly scan a whole table.
+    """
+    report = []
+    regressions = []
+    for name, query, expected_scan in audited_queries():
+        plan, full_scan = explain(query)
+        if full_scan and not expected_scan:
+            status = 'SCAN COMPLETO'
+            regressions.append(name)
+        elif full_scan:
+            status = 'scan completo (esperado)'
+        else:
+            status = 'ok'
+        report.append(f'[{status}] {name}')
+        report.extend(f'    {line}' for line in plan)
+    return report, regressions
@@ -0,0 +1,27 @@
+from datetime import datetime
+from api.app import db
+
+class Message(db.Model):
+    __tablename__ = 'messages'
+    # History is always read per project in chronological order
+    __table_args__ = (
+        db.Index('ix_messages_proyecto_fecha', 'proyecto_id', 'fecha_creacion'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    contenido = db.Column(db.Text, nullable=False)
+    es_bot = db.Column(db.Boolean, default=False, nullable=False)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    proyecto_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
+
+    # Relaciones (messages are removed by the database when their project is deleted)
+    proyecto = db.relationship('Project', backref=db.backref('mensajes', lazy=True, passive_deletes=True))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'contenido': self.contenido,
+            'es_bot': self.es_bot,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            'proyecto_id': self.proyecto_id
+        }
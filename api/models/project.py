@@ -3,23 +3,43 @@ from api.app import db
 
 class Project(db.Model):
     __tablename__ = 'projects'
+    # Non-admin listings filter by owner and page through the ids
+    __table_args__ = (
+        db.Index('ix_projects_usuario_id', 'usuario_id', 'id'),
+        db.Index('ix_projects_clave_lote', 'clave_lote', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     descripcion = db.Column(db.Text)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
     fecha_modificacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped by every UPDATE; DATETIME only keeps whole seconds on MySQL, so validators rely on this
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                        onupdate=db.literal_column('version') + 1)
     usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Set by batch creates to read their rows back; not exposed by the API
+    clave_lote = db.Column(db.String(48))
 
     # Relaciones
     usuario = db.relationship('User', backref=db.backref('projects', lazy=True))
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'nombre': self.nombre,
-            'descripcion': self.descripcion,
-            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
-            'fecha_modificacion': self.fecha_modificacion.isoformat() if self.fecha_modificacion else None,
-            'usuario_id': self.usuario_id
-        }
+    # Fields exposed by the API and the column(s) each one reads
+    PUBLIC_FIELDS = {
+        'id': ('id',),
+        'nombre': ('nombre',),
+        'descripcion': ('descripcion',),
+        'fecha_creacion': ('fecha_creacion',),
+        'fecha_modificacion': ('fecha_modificacion',),
+        'usuario_id': ('usuario_id',)
+    }
+
+    def to_dict(self, fields=None):
+        """
+        Serializes the project, optionally restricted to the given fields
+        """
+        data = {}
+        for field in fields or self.PUBLIC_FIELDS:
+            value = getattr(self, field)
+            data[field] = value.isoformat() if isinstance(value, datetime) else value
+        return data
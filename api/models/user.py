@@ -1,20 +1,29 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import re
+from flask import g, has_request_context
 from api.app import db
 
 class User(db.Model):
     __tablename__ = 'users'
+    # Login and uniqueness checks look users up by username and by correo
+    __table_args__ = (
+        db.Index('ix_users_username', 'username', unique=True),
+        db.Index('ix_users_correo', 'correo', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(50), nullable=False)
     apellidos = db.Column(db.String(100), nullable=False)
-    correo = db.Column(db.String(120), unique=True, nullable=False)
-    username = db.Column(db.String(80), unique=True, nullable=False)
+    correo = db.Column(db.String(120), nullable=False)
+    username = db.Column(db.String(80), nullable=False)
     password = db.Column(db.String(255), nullable=False)  # Changed from password_hash for Praetorian
     is_admin = db.Column(db.Boolean, default=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.now)
     fecha_modificacion = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    # Bumped by every UPDATE; DATETIME only keeps whole seconds on MySQL, so validators rely on this
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                        onupdate=db.literal_column('version') + 1)
 
     # Flask-Praetorian specific roles property
     @property
@@ -45,7 +54,20 @@ class User(db.Model):
     # Required by flask-praetorian for password validation
     @classmethod
     def identify(cls, id):
-        """Required by flask-praetorian for id lookup"""
+        """Required by flask-praetorian for id lookup, resolved once per request"""
+        if not has_request_context():
+            return cls.query.get(id)
+
+        identified = g.setdefault('identified_users', {})
+        if id not in identified:
+            identified[id] = cls.query.get(id)
+        return identified[id]
+
+    @classmethod
+    def get_for_caller(cls, id, caller):
+        """Loads a user by id, reusing the already loaded caller when it is the same user"""
+        if caller is not None and str(id) == str(caller.id):
+            return caller
         return cls.query.get(id)
 
     def is_valid(self):
@@ -60,18 +82,29 @@ class User(db.Model):
         self.password = password  # Hashing handled by Flask-Praetorian
         self.is_admin = is_admin
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'nombre': self.nombre,
-            'apellidos': self.apellidos,
-            'correo': self.correo,
-            'username': self.username,
-            'is_admin': self.is_admin,
-            'roles': self.roles,
-            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
-            'fecha_modificacion': self.fecha_modificacion.isoformat() if self.fecha_modificacion else None
-        }
+    # Columns needed to serialize each public field, in output order
+    PUBLIC_FIELDS = {
+        'id': ('id',),
+        'nombre': ('nombre',),
+        'apellidos': ('apellidos',),
+        'correo': ('correo',),
+        'username': ('username',),
+        'is_admin': ('is_admin',),
+        'roles': ('is_admin',),
+        'fecha_creacion': ('fecha_creacion',),
+        'fecha_modificacion': ('fecha_modificacion',)
+    }
+
+    def to_dict(self, fields=None):
+        """
+        Serializes the user. When fields is given only those fields are read,
+        so columns left out of a projected query are never lazy-loaded
+        """
+        data = {}
+        for field in fields or self.PUBLIC_FIELDS:
+            value = getattr(self, field)
+            data[field] = value.isoformat() if isinstance(value, datetime) else value
+        return data
 
     @staticmethod
     def get(user_id):
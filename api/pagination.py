@@ -0,0 +1,87 @@
+from flask import request
+from sqlalchemy.orm import load_only
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class PaginationError(ValueError):
+    """
+    Raised when the pagination or projection query arguments are invalid
+    """
+
+
+def parse_fields(model):
+    """
+    Reads the ?fields=a,b,c projection. Returns None when every field is wanted
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in model.PUBLIC_FIELDS]
+    if unknown:
+        raise PaginationError(f'Campos desconocidos: {", ".join(unknown)}')
+    return fields
+
+
+def parse_page_args():
+    """
+    Reads ?limit= and ?cursor= (the id of the last item of the previous page).
+    Requests with neither are not paginated (limit None), as before
+    pagination existed; a cursor alone gets DEFAULT_PAGE_SIZE items.
+    """
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return None, None
+
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        raise PaginationError('Los parámetros limit y cursor deben ser enteros')
+
+    if limit < 1:
+        raise PaginationError('El parámetro limit debe ser mayor que 0')
+    return min(limit, MAX_PAGE_SIZE), cursor
+
+
+def paginate(query, model):
+    """
+    Applies keyset pagination on the primary key and loads only the columns
+    needed by the requested fields.
+    Returns the items of the page, the cursor of the next page (or None) and the fields.
+    """
+    fields = parse_fields(model)
+    limit, cursor = parse_page_args()
+
+    if cursor is not None:
+        query = query.filter(model.id > cursor)
+
+    if fields is not None:
+        # id and version are also read by the page's validator
+        columns = {'id', 'version'}
+        for field in fields:
+            columns.update(model.PUBLIC_FIELDS[field])
+        query = query.options(load_only(*[getattr(model, column) for column in columns]))
+
+    query = query.order_by(model.id)
+    if limit is None:
+        return query.all(), None, fields
+
+    # Fetch one extra row to know whether there is a next page
+    items = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = items[-1].id
+
+    return items, next_cursor, fields
+
+
+def page_response(key, items, next_cursor, fields=None):
+    return {
+        key: [item.to_dict(fields) for item in items],
+        'next_cursor': next_cursor
+    }
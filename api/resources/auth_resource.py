@@ -1,7 +1,8 @@
 from flask import request
 from flask_restful import Resource
 from flask_praetorian import auth_required, current_user
-from api.app import guard
+from api.app import guard, hasher
+from api.hashing import HashingPoolBusy, busy_response
 
 class LoginResource(Resource):
     def post(self):
@@ -12,12 +13,22 @@ class LoginResource(Resource):
         if not username or not password:
             return {'message': 'Se requiere nombre de usuario y contraseña'}, 400
 
-        user = guard.authenticate(username, password)
+        # Password verification runs on the hashing pool, not on this thread
+        try:
+            user = hasher.authenticate(username, password)
+        except HashingPoolBusy as e:
+            return busy_response(e)
         if not user:
             return {'message': 'Credenciales inválidas'}, 401
 
-        # Create an access token with Flask-Praetorian
-        access_token = guard.encode_jwt_token(user)
+        # Create an access token with Flask-Praetorian, carrying the profile
+        # so the web tier can rebuild the user without calling back
+        access_token = guard.encode_jwt_token(user, usr={
+            'username': user.username,
+            'correo': user.correo,
+            'nombre': user.nombre,
+            'apellidos': user.apellidos
+        })
 
         return {
             'message': 'Login exitoso',
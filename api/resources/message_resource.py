@@ -0,0 +1,118 @@
+from flask import request
+from flask_restful import Resource
+from flask_praetorian import auth_required, current_user
+from sqlalchemy import tuple_
+from api.app import db
+from api.models.message import Message
+from api.models.project import Project
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _check_project_access(project_id, user):
+    """
+    Returns the project if the user may access it, otherwise an error response
+    """
+    project = db.session.get(Project, project_id)
+    if not project:
+        return None, ({'message': 'Proyecto no encontrado'}, 404)
+
+    if "admin" not in user.roles and project.usuario_id != user.id:
+        return None, ({'message': 'No tienes acceso a este proyecto'}, 403)
+
+    return project, None
+
+class ProjectMessageListResource(Resource):
+    @auth_required
+    def get(self, project_id):
+        """
+        Returns the project history in chronological order.
+        Without ?since= the latest messages are returned, or with ?before=<id>
+        the ones right before that message; has_more tells whether there are
+        older ones and prev_cursor is the value for the next ?before=.
+        With ?since=<id> only the messages written after that one;
+        has_more tells whether there are newer ones than next_cursor.
+        """
+        project, error = _check_project_access(project_id, current_user())
+        if error:
+            return error
+
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            since = request.args.get('since')
+            since = int(since) if since else None
+            before = request.args.get('before')
+            before = int(before) if before else None
+        except ValueError:
+            return {'message': 'Los parámetros limit, since y before deben ser enteros'}, 400
+
+        if limit < 1:
+            return {'message': 'El parámetro limit debe ser mayor que 0'}, 400
+        if since is not None and before is not None:
+            return {'message': 'Los parámetros since y before no se pueden combinar'}, 400
+
+        query = Message.query.filter(Message.proyecto_id == project.id)
+        order = (Message.fecha_creacion, Message.id)
+
+        cursor = since if since is not None else before
+        anchor = None
+        if cursor is not None:
+            anchor = Message.query.filter_by(id=cursor, proyecto_id=project.id).first()
+            if not anchor:
+                return {'message': 'Cursor de mensajes no válido'}, 400
+
+        if since is None:
+            # Tail of the conversation (or of what precedes ?before=), read backwards through the index
+            if anchor is not None:
+                query = query.filter(tuple_(*order) < tuple_(anchor.fecha_creacion, anchor.id))
+            messages = query.order_by(*[column.desc() for column in order]).limit(limit + 1).all()
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            messages.reverse()
+        else:
+            messages = query.filter(
+                tuple_(*order) > tuple_(anchor.fecha_creacion, anchor.id)
+            ).order_by(*order).limit(limit + 1).all()
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+
+        return {
+            'messages': [message.to_dict() for message in messages],
+            'next_cursor': messages[-1].id if messages else since,
+            'prev_cursor': messages[0].id if messages else before,
+            'has_more': has_more
+        }
+
+    @auth_required
+    def post(self, project_id):
+        """
+        Appends one message, or a batch of them under a 'messages' list
+        (e.g. a whole chat turn), in a single transaction
+        """
+        project, error = _check_project_access(project_id, current_user())
+        if error:
+            return error
+
+        data = request.get_json() or {}
+        items = data['messages'] if isinstance(data.get('messages'), list) else [data]
+        if not items or not all(isinstance(item, dict) and item.get('contenido') for item in items):
+            return {'message': 'El contenido del mensaje es obligatorio'}, 400
+
+        try:
+            messages = [
+                Message(
+                    contenido=item.get('contenido'),
+                    es_bot=bool(item.get('es_bot', False)),
+                    proyecto_id=project.id
+                )
+                for item in items
+            ]
+            db.session.add_all(messages)
+            db.session.commit()
+            return {
+                'message': 'Mensajes guardados exitosamente' if len(messages) > 1 else 'Mensaje guardado exitosamente',
+                'messages': [message.to_dict() for message in messages]
+            }, 201
+        except Exception as e:
+            db.session.rollback()
+            return {'message': f'Error al guardar mensaje: {str(e)}'}, 500
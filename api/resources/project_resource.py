@@ -1,9 +1,14 @@
+import uuid
 from flask import request
 from flask_restful import Resource
 from flask_praetorian import auth_required, current_user, roles_required, roles_accepted
+from sqlalchemy import insert
 from api.app import db
 from api.models.project import Project
 from api.models.user import User
+from api.pagination import paginate, page_response, PaginationError
+from api.conditional import row_etag, page_etag, is_not_modified, not_modified, etag_header
+from api.batch import parse_batch, parse_batch_ids, failed_batch, BatchResults, BatchError
 
 class ProjectListResource(Resource):
     @auth_required
@@ -12,12 +17,20 @@ class ProjectListResource(Resource):
 
         if "admin" in user.roles:
             # Admins can see all projects
-            projects = Project.query.all()
+            query = Project.query
         else:
             # Regular users can only see their own projects
-            projects = Project.query.filter_by(usuario_id=user.id).all()
+            query = Project.query.filter_by(usuario_id=user.id)
 
-        return {'projects': [project.to_dict() for project in projects]}
+        try:
+            projects, next_cursor, fields = paginate(query, Project)
+        except PaginationError as e:
+            return {'message': str(e)}, 400
+
+        etag = page_etag(Project, projects, next_cursor, user.id, ",".join(user.roles))
+        if is_not_modified(etag):
+            return not_modified(etag)
+        return page_response('projects', projects, next_cursor, fields), 200, etag_header(etag)
 
     @auth_required
     def post(self):
@@ -29,7 +42,7 @@ class ProjectListResource(Resource):
             data['usuario_id'] = current_user_obj.id
 
         # Check if user exists
-        user = User.query.get(data.get('usuario_id'))
+        user = User.get_for_caller(data.get('usuario_id'), current_user_obj)
         if not user:
             return {'message': 'Usuario no encontrado'}, 404
 
@@ -63,7 +76,11 @@ class ProjectResource(Resource):
         if "admin" not in user.roles and project.usuario_id != user.id:
             return {'message': 'No tienes acceso a este proyecto'}, 403
 
-        return {'project': project.to_dict()}
+        etag = row_etag(project)
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        return {'project': project.to_dict()}, 200, etag_header(etag)
 
     @auth_required
     def put(self, project_id):
@@ -90,7 +107,7 @@ class ProjectResource(Resource):
                     return {'message': 'No tienes permiso para cambiar el propietario del proyecto'}, 403
 
                 # Check if new user exists
-                new_user = User.query.get(data.get('usuario_id'))
+                new_user = User.get_for_caller(data.get('usuario_id'), user)
                 if not new_user:
                     return {'message': 'Usuario no encontrado'}, 404
                 project.usuario_id = data.get('usuario_id')
@@ -120,3 +137,145 @@ class ProjectResource(Resource):
         except Exception as e:
             db.session.rollback()
             return {'message': f'Error al eliminar proyecto: {str(e)}'}, 500
+
+class ProjectBatchResource(Resource):
+    @auth_required
+    def post(self):
+        """
+        Creates several projects in one transaction. Regular users can only
+        create projects for themselves; owners are checked with one query.
+        """
+        try:
+            items = parse_batch('projects')
+        except BatchError as e:
+            return {'message': str(e)}, 400
+
+        user = current_user()
+        is_admin = "admin" in user.roles
+        results = BatchResults(len(items))
+
+        # Set the current user as the owner if not specified
+        owner_ids = [item.setdefault('usuario_id', user.id) for item in items]
+        owners = {user.id} | {
+            owner_id for (owner_id,) in User.query.with_entities(User.id).filter(
+                User.id.in_([owner_id for owner_id in owner_ids if isinstance(owner_id, int) and owner_id != user.id])
+            )
+        }
+
+        for index, item in enumerate(items):
+            if not item.get('nombre'):
+                results.error(index, 400, 'Faltan campos: nombre')
+            elif not is_admin and item['usuario_id'] != user.id:
+                results.error(index, 403, 'No tienes permiso para crear proyectos para otros usuarios')
+            elif not isinstance(item['usuario_id'], int) or item['usuario_id'] not in owners:
+                results.error(index, 404, 'Usuario no encontrado')
+
+        valid = results.pending()
+        if not valid:
+            return results.response()
+
+        # Each row carries a key unique to this request, which reads it back
+        token = uuid.uuid4().hex
+        rows = [
+            {
+                'nombre': items[index]['nombre'],
+                'descripcion': items[index].get('descripcion'),
+                'usuario_id': items[index]['usuario_id'],
+                'clave_lote': f'{token}-{index}'
+            }
+            for index in valid
+        ]
+        try:
+            # A single executemany INSERT; the ids are read back with one query in the same transaction
+            db.session.execute(insert(Project), rows)
+            created = Project.query.filter(Project.clave_lote.in_([row['clave_lote'] for row in rows]))
+            created = {project.clave_lote: project for project in created}
+            for index, row in zip(valid, rows):
+                results.ok(index, 201, project=created[row['clave_lote']].to_dict())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            return failed_batch('crear proyectos')
+        return results.response()
+
+    @auth_required
+    def patch(self):
+        """
+        Updates several projects in one transaction. Each item carries the
+        id of the project and the fields to change.
+        """
+        try:
+            items = parse_batch('projects')
+        except BatchError as e:
+            return {'message': str(e)}, 400
+
+        user = current_user()
+        is_admin = "admin" in user.roles
+        results = BatchResults(len(items))
+
+        ids = [item.get('id') for item in items if isinstance(item.get('id'), int)]
+        projects = {project.id: project for project in Project.query.filter(Project.id.in_(ids))}
+        new_owner_ids = [item['usuario_id'] for item in items if isinstance(item.get('usuario_id'), int)]
+        owners = {
+            owner_id for (owner_id,) in User.query.with_entities(User.id).filter(User.id.in_(new_owner_ids))
+        } if is_admin and new_owner_ids else set()
+
+        for index, item in enumerate(items):
+            project = projects.get(item.get('id')) if isinstance(item.get('id'), int) else None
+            if not project:
+                results.error(index, 404, 'Proyecto no encontrado')
+            elif not is_admin and project.usuario_id != user.id:
+                results.error(index, 403, 'No tienes permiso para editar este proyecto')
+            elif item.get('usuario_id') and not is_admin:
+                # Only admins can change project ownership
+                results.error(index, 403, 'No tienes permiso para cambiar el propietario del proyecto')
+            elif item.get('usuario_id') and item['usuario_id'] not in owners:
+                results.error(index, 404, 'Usuario no encontrado')
+
+        updated = results.pending()
+        try:
+            for index in updated:
+                item = items[index]
+                project = projects[item['id']]
+                for field in ('nombre', 'descripcion', 'usuario_id'):
+                    if item.get(field):
+                        setattr(project, field, item[field])
+
+            db.session.flush()
+            for index in updated:
+                results.ok(index, 200, project=projects[items[index]['id']].to_dict())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            return failed_batch('actualizar proyectos')
+        return results.response()
+
+    @auth_required
+    def delete(self):
+        """
+        Deletes several projects in one transaction
+        """
+        try:
+            ids = parse_batch_ids()
+        except BatchError as e:
+            return {'message': str(e)}, 400
+
+        user = current_user()
+        results = BatchResults(len(ids))
+        projects = {project.id: project for project in Project.query.filter(Project.id.in_(ids))}
+
+        try:
+            for index, project_id in enumerate(ids):
+                project = projects.get(project_id)
+                if not project:
+                    results.error(index, 404, 'Proyecto no encontrado')
+                elif "admin" not in user.roles and project.usuario_id != user.id:
+                    results.error(index, 403, 'No tienes permiso para eliminar este proyecto')
+                else:
+                    db.session.delete(project)
+                    results.ok(index, 200, id=project_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            return failed_batch('eliminar proyectos')
+        return results.response()
@@ -0,0 +1,19 @@
+from flask_restful import Resource
+from flask_praetorian import auth_required, roles_accepted
+from api.app import hasher
+from api.db_pool import pool_telemetry, replica_pool_telemetry
+from api.db_routing import stats as routing_stats
+
+class StatsResource(Resource):
+    @auth_required
+    @roles_accepted('admin')
+    def get(self):
+        """
+        Internal runtime metrics of the API service, for admins only
+        """
+        return {
+            'password_hashing': hasher.stats(),
+            'db_pool': pool_telemetry.stats(),
+            'db_replica_pool': replica_pool_telemetry.stats() if replica_pool_telemetry.engine else None,
+            'db_routing': routing_stats()
+        }
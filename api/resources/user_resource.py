@@ -1,16 +1,30 @@
 from flask import request, jsonify
 from flask_restful import Resource
-from flask_praetorian import auth_required, current_user, roles_required, roles_accepted
-from api.app import db, guard
+from flask_praetorian import auth_required, current_user, current_user_id, roles_required, roles_accepted
+from sqlalchemy import delete, func, insert, or_
+from api.app import db, hasher
+from api.hashing import HashingPoolBusy, busy_response
 from api.models.user import User
+from api.models.project import Project
+from api.pagination import paginate, page_response, PaginationError
+from api.conditional import row_etag, page_etag, is_not_modified, not_modified, etag_header
+from api.batch import parse_batch, parse_batch_ids, missing_fields, failed_batch, BatchResults, BatchError
 
 class UserListResource(Resource):
     @auth_required
     @roles_accepted('admin')
     def get(self):
         # Only admin users can list all users
-        users = User.query.all()
-        return {'users': [user.to_dict() for user in users]}
+        try:
+            users, next_cursor, fields = paginate(User.query, User)
+        except PaginationError as e:
+            return {'message': str(e)}, 400
+
+        # The validator comes from the page itself, so a 304 only skips serializing it
+        etag = page_etag(User, users, next_cursor)
+        if is_not_modified(etag):
+            return not_modified(etag)
+        return page_response('users', users, next_cursor, fields), 200, etag_header(etag)
 
     @auth_required
     @roles_accepted('admin')
@@ -26,9 +40,12 @@ class UserListResource(Resource):
             return {'message': 'Usuario con ese correo ya existe'}, 409
 
         try:
-            # Hash the password with Praetorian
-            hashed_password = guard.hash_password(data.get('password'))
+            # Hash the password with Praetorian, on the hashing pool
+            hashed_password = hasher.hash_password(data.get('password'))
+        except HashingPoolBusy as e:
+            return busy_response(e)
 
+        try:
             user = User(
                 nombre=data.get('nombre'),
                 apellidos=data.get('apellidos'),
@@ -53,10 +70,14 @@ class UserResource(Resource):
         if "admin" not in current_user_obj.roles and current_user_obj.id != user_id:
             return {'message': 'Acceso denegado'}, 403
 
-        user = User.query.get(user_id)
-        if user:
-            return {'user': user.to_dict()}
-        return {'message': 'Usuario no encontrado'}, 404
+        user = User.get_for_caller(user_id, current_user_obj)
+        if not user:
+            return {'message': 'Usuario no encontrado'}, 404
+
+        etag = row_etag(user)
+        if is_not_modified(etag):
+            return not_modified(etag)
+        return {'user': user.to_dict()}, 200, etag_header(etag)
 
     @auth_required
     def put(self, user_id):
@@ -66,7 +87,7 @@ class UserResource(Resource):
         if "admin" not in current_user_obj.roles and current_user_obj.id != user_id:
             return {'message': 'Acceso denegado'}, 403
 
-        user = User.query.get(user_id)
+        user = User.get_for_caller(user_id, current_user_obj)
         if not user:
             return {'message': 'Usuario no encontrado'}, 404
 
@@ -85,6 +106,14 @@ class UserResource(Resource):
         if 'is_admin' in data and "admin" not in current_user_obj.roles:
             return {'message': 'No tienes permiso para cambiar el estado de administrador'}, 403
 
+        # Hash before touching the user so a saturated pool leaves it unchanged
+        hashed_password = None
+        if data.get('password'):
+            try:
+                hashed_password = hasher.hash_password(data.get('password'))
+            except HashingPoolBusy as e:
+                return busy_response(e)
+
         try:
             if data.get('nombre'):
                 user.nombre = data.get('nombre')
@@ -94,8 +123,8 @@ class UserResource(Resource):
                 user.correo = data.get('correo')
             if data.get('username'):
                 user.username = data.get('username')
-            if data.get('password'):
-                user.password = guard.hash_password(data.get('password'))
+            if hashed_password:
+                user.password = hashed_password
             if 'is_admin' in data and "admin" in current_user_obj.roles:
                 user.is_admin = data.get('is_admin')
 
@@ -108,9 +137,8 @@ class UserResource(Resource):
     @auth_required
     @roles_accepted('admin')
     def delete(self, user_id):
-        current_user_obj = current_user()
-
-        if int(current_user_obj.id) == int(user_id):
+        # Only the caller's id is needed, and it comes from the token
+        if int(current_user_id()) == int(user_id):
             return {'message': 'No puedes eliminar tu propia cuenta'}, 403
 
         user = User.query.get(user_id)
@@ -124,3 +152,181 @@ class UserResource(Resource):
         except Exception as e:
             db.session.rollback()
             return {'message': f'Error al eliminar usuario: {str(e)}'}, 500
+
+USER_REQUIRED_FIELDS = ('nombre', 'apellidos', 'correo', 'username', 'password')
+
+def owner_message(project_count):
+    return f'El usuario tiene {project_count} proyecto(s); elimínalos antes de eliminar el usuario'
+
+class UserBatchResource(Resource):
+    @auth_required
+    @roles_accepted('admin')
+    def post(self):
+        """
+        Creates several users in one transaction.
+        Uniqueness is checked with a single query for the whole batch and
+        the passwords are hashed in parallel on the hashing pool.
+        """
+        try:
+            items = parse_batch('users')
+        except BatchError as e:
+            return {'message': str(e)}, 400
+
+        results = BatchResults(len(items))
+        taken = User.query.with_entities(User.username, User.correo).filter(or_(
+            User.username.in_([item.get('username') for item in items]),
+            User.correo.in_([item.get('correo') for item in items])
+        )).all()
+        usernames = {username for username, _ in taken}
+        correos = {correo for _, correo in taken}
+
+        for index, item in enumerate(items):
+            missing = missing_fields(item, USER_REQUIRED_FIELDS)
+            if missing:
+                results.error(index, 400, f'Faltan campos: {", ".join(missing)}')
+            elif item['username'] in usernames:
+                results.error(index, 409, 'Usuario con ese nombre de usuario ya existe')
+            elif item['correo'] in correos:
+                results.error(index, 409, 'Usuario con ese correo ya existe')
+            else:
+                # Later items of the batch can't reuse them either
+                usernames.add(item['username'])
+                correos.add(item['correo'])
+
+        valid = results.pending()
+        if not valid:
+            return results.response()
+
+        try:
+            hashed_passwords = hasher.hash_many([items[index]['password'] for index in valid])
+        except HashingPoolBusy as e:
+            return busy_response(e)
+
+        rows = [
+            {
+                'nombre': items[index]['nombre'],
+                'apellidos': items[index]['apellidos'],
+                'correo': items[index]['correo'],
+                'username': items[index]['username'],
+                'password': hashed_password,
+                'is_admin': bool(items[index].get('is_admin', False))
+            }
+            for index, hashed_password in zip(valid, hashed_passwords)
+        ]
+        try:
+            # A single executemany INSERT; the ids are read back with one query
+            db.session.execute(insert(User), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            return failed_batch('crear usuarios')
+
+        created = User.query.filter(User.username.in_([row['username'] for row in rows]))
+        created = {user.username: user for user in created}
+        for index in valid:
+            results.ok(index, 201, user=created[items[index]['username']].to_dict())
+        return results.response()
+
+    @auth_required
+    @roles_accepted('admin')
+    def patch(self):
+        """
+        Updates several users in one transaction. Each item carries the id
+        of the user and the fields to change.
+        """
+        try:
+            items = parse_batch('users')
+        except BatchError as e:
+            return {'message': str(e)}, 400
+
+        results = BatchResults(len(items))
+        ids = [item.get('id') for item in items if isinstance(item.get('id'), int)]
+        users = {user.id: user for user in User.query.filter(User.id.in_(ids))}
+
+        # Owners of the usernames and emails the batch wants to take
+        taken = User.query.with_entities(User.id, User.username, User.correo).filter(or_(
+            User.username.in_([item['username'] for item in items if item.get('username')]),
+            User.correo.in_([item['correo'] for item in items if item.get('correo')])
+        )).all()
+        username_owner = {username: user_id for user_id, username, _ in taken}
+        correo_owner = {correo: user_id for user_id, _, correo in taken}
+
+        for index, item in enumerate(items):
+            user_id = item.get('id')
+            if not isinstance(user_id, int) or user_id not in users:
+                results.error(index, 404, 'Usuario no encontrado')
+            elif item.get('username') and username_owner.setdefault(item['username'], user_id) != user_id:
+                results.error(index, 409, 'Nombre de usuario ya está en uso')
+            elif item.get('correo') and correo_owner.setdefault(item['correo'], user_id) != user_id:
+                results.error(index, 409, 'Correo ya está en uso')
+
+        valid = [index for index in results.pending() if items[index].get('password')]
+        try:
+            hashed_passwords = hasher.hash_many([items[index]['password'] for index in valid])
+        except HashingPoolBusy as e:
+            return busy_response(e)
+        hashed_passwords = dict(zip(valid, hashed_passwords))
+
+        updated = results.pending()
+        try:
+            for index in updated:
+                item = items[index]
+                user = users[item['id']]
+                for field in ('nombre', 'apellidos', 'correo', 'username'):
+                    if item.get(field):
+                        setattr(user, field, item[field])
+                if index in hashed_passwords:
+                    user.password = hashed_passwords[index]
+                if 'is_admin' in item:
+                    user.is_admin = bool(item['is_admin'])
+
+            db.session.flush()
+            for index in updated:
+                results.ok(index, 200, user=users[items[index]['id']].to_dict())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            return failed_batch('actualizar usuarios')
+        return results.response()
+
+    @auth_required
+    @roles_accepted('admin')
+    def delete(self):
+        """
+        Deletes several users in one transaction. Users who still own
+        projects are reported as 409 and the rest are deleted.
+        """
+        try:
+            ids = parse_batch_ids()
+        except BatchError as e:
+            return {'message': str(e)}, 400
+
+        results = BatchResults(len(ids))
+        caller_id = int(current_user_id())
+        existing = {user_id for (user_id,) in User.query.with_entities(User.id).filter(User.id.in_(ids))}
+        project_counts = dict(
+            db.session.query(Project.usuario_id, func.count(Project.id))
+            .filter(Project.usuario_id.in_(ids))
+            .group_by(Project.usuario_id)
+        )
+
+        deleted = set()
+        for index, user_id in enumerate(ids):
+            if user_id == caller_id:
+                results.error(index, 403, 'No puedes eliminar tu propia cuenta')
+            elif user_id not in existing:
+                results.error(index, 404, 'Usuario no encontrado')
+            elif user_id in project_counts:
+                results.error(index, 409, owner_message(project_counts[user_id]))
+            else:
+                deleted.add(user_id)
+                results.ok(index, 200, id=user_id)
+
+        if deleted:
+            try:
+                db.session.execute(delete(User).where(User.id.in_(deleted)))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                return failed_batch('eliminar usuarios')
+        return results.response()
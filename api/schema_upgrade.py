@@ -0,0 +1,84 @@
+from sqlalchemy import inspect, text
+from api.app import db
+
+
+def _quote(name):
+    return db.engine.dialect.identifier_preparer.quote(name)
+
+
+def add_column_statement(column):
+    """
+    DDL that adds a model column to an existing table. Required columns
+    need a server default to fill the existing rows.
+    """
+    dialect = db.engine.dialect
+    ddl = f'ALTER TABLE {_quote(column.table.name)} ADD COLUMN {_quote(column.name)} {column.type.compile(dialect)}'
+    if column.server_default is not None:
+        ddl += f' DEFAULT {column.server_default.arg}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    return ddl
+
+
+def add_index_statement(index):
+    """
+    DDL that adds a model index to an existing table
+    """
+    columns = ', '.join(_quote(column.name) for column in index.columns)
+    unique = 'UNIQUE ' if index.unique else ''
+    if db.engine.dialect.name == 'mysql':
+        return f'ALTER TABLE {_quote(index.table.name)} ADD {unique}INDEX {_quote(index.name)} ({columns})'
+    return f'CREATE {unique}INDEX {_quote(index.name)} ON {_quote(index.table.name)} ({columns})'
+
+
+def pending_statements():
+    """
+    Statements that bring tables created by an older version up to the
+    models: the columns and indexes they lack and, on MySQL, the unnamed
+    unique keys that the named unique indexes replace. Tables that don't exist yet are
+    left to create_all.
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    statements = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        statements.extend(add_column_statement(column) for column in table.columns if column.name not in columns)
+
+        existing = inspector.get_indexes(table.name)
+        names = {index['name'] for index in existing}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in names:
+                continue
+            statements.append(add_index_statement(index))
+            if index.unique and db.engine.dialect.name == 'mysql':
+                columns = [column.name for column in index.columns]
+                statements.extend(
+                    f'ALTER TABLE {_quote(table.name)} DROP INDEX {_quote(legacy["name"])}'
+                    for legacy in existing
+                    if legacy['unique'] and legacy['column_names'] == columns
+                )
+    return statements
+
+
+def upgrade_schema(dry_run=False):
+    """
+    Runs (or only returns, with dry_run) the pending statements.
+    Idempotent: a second run finds nothing to do.
+    """
+    from api.bootstrap import bootstrap_lock
+
+    # The models must be imported for their tables to be in the metadata
+    from api.models.user import User
+    from api.models.project import Project
+    from api.models.message import Message
+
+    with bootstrap_lock():
+        statements = pending_statements()
+        if not dry_run:
+            with db.engine.begin() as connection:
+                for statement in statements:
+                    connection.execute(text(statement))
+    return statements
@@ -0,0 +1,181 @@
+"""
+Benchmark harness for the three microservices.
+
+    python -m bench.run --users 500 --concurrency 8 --requests 400
+    python -m bench.run --scenario chat_turn --compare bench/results/anterior.json
+
+Boots the apps in this process (see bench/stack.py), seeds fake data and
+runs each scenario with a pool of client threads. Reports throughput,
+latency percentiles, SQL statements and API calls per operation, and
+writes the results as JSON.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime
+
+from bench.scenarios import SCENARIOS
+from bench.stack import Stack
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(stack, scenario_class, concurrency, total_operations, warmup):
+    scenario = scenario_class(stack)
+    states = [scenario.setup(worker) for worker in range(concurrency)]
+
+    for state in states[:1]:
+        for _ in range(warmup):
+            scenario.run(state)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = [total_operations]
+
+    def worker(state):
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                scenario.run(state)
+                failure = None
+            except Exception as e:
+                failure = str(e)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if failure:
+                    errors.append(failure)
+
+    queries_before = stack.queries.read()
+    api_calls_before = stack.gateway.api.counters.snapshot()['requests']
+    started = time.perf_counter()
+
+    threads = [threading.Thread(target=worker, args=(state,)) for state in states]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    duration = time.perf_counter() - started
+    operations = len(latencies)
+    latencies.sort()
+    to_ms = 1000.0
+    return {
+        'operations': operations,
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'duration': duration,
+        'rps': operations / duration if duration else 0.0,
+        'latency_ms': {
+            'mean': sum(latencies) / operations * to_ms if operations else 0.0,
+            'p50': percentile(latencies, 0.50) * to_ms,
+            'p95': percentile(latencies, 0.95) * to_ms,
+            'p99': percentile(latencies, 0.99) * to_ms,
+            'max': latencies[-1] * to_ms if latencies else 0.0,
+        },
+        'db_queries_per_op': (stack.queries.read() - queries_before) / operations if operations else 0.0,
+        'web_api_calls_per_op': (
+            (stack.gateway.api.counters.snapshot()['requests'] - api_calls_before) / operations
+            if operations else 0.0
+        ),
+    }
+
+
+def print_report(results, baseline=None):
+    header = f'{"escenario":<15}{"ops":>7}{"err":>6}{"rps":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"sql/op":>8}'
+    print(header)
+    print('-' * len(header))
+    for name, result in results['scenarios'].items():
+        latency = result['latency_ms']
+        print(f'{name:<15}{result["operations"]:>7}{result["errors"]:>6}{result["rps"]:>9.1f}'
+              f'{latency["p50"]:>9.1f}{latency["p95"]:>9.1f}{latency["p99"]:>9.1f}{result["db_queries_per_op"]:>8.1f}')
+        for sample in result['error_samples']:
+            print(f'    error: {sample}')
+
+        previous = (baseline or {}).get('scenarios', {}).get(name)
+        if previous:
+            def change(new, old):
+                return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+            print(f'    vs. base: rps {change(result["rps"], previous["rps"])}, '
+                  f'p95 {change(latency["p95"], previous["latency_ms"]["p95"])}, '
+                  f'sql/op {change(result["db_queries_per_op"], previous["db_queries_per_op"])}')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark de los microservicios')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='escenario a ejecutar (repetible; por defecto todos)')
+    parser.add_argument('--users', type=int, default=100, help='usuarios generados')
+    parser.add_argument('--projects', type=int, default=3, help='proyectos por usuario')
+    parser.add_argument('--messages', type=int, default=10, help='mensajes por proyecto')
+    parser.add_argument('--concurrency', type=int, default=8, help='clientes simultáneos')
+    parser.add_argument('--requests', type=int, default=200, help='operaciones por escenario')
+    parser.add_argument('--warmup', type=int, default=5, help='operaciones de calentamiento por escenario')
+    parser.add_argument('--database-url', help='base de datos (por defecto un SQLite temporal)')
+    parser.add_argument('--hash-rounds', type=int, help='coste del hash de contraseñas (PASSWORD_HASH_ROUNDS)')
+    parser.add_argument('--output', help='fichero JSON de resultados (por defecto bench/results/<fecha>.json)')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior con la que comparar')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = args.scenario or list(SCENARIOS)
+
+    stack = Stack(database_url=args.database_url, hash_rounds=args.hash_rounds).start()
+    try:
+        stack.seed(users=args.users, projects=args.projects, messages=args.messages)
+        print(f'Datos: {args.users} usuarios, {args.projects} proyectos/usuario, {args.messages} mensajes/proyecto '
+              f'({stack.dialect})')
+
+        results = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'config': vars(args),
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'database': stack.dialect,
+            },
+            'scenarios': {},
+        }
+        for name in scenarios:
+            results['scenarios'][name] = run_scenario(
+                stack, SCENARIOS[name], args.concurrency, args.requests, args.warmup
+            )
+    finally:
+        stack.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f'Resultados guardados en {output}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
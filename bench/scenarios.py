@@ -0,0 +1,120 @@
+"""
+Benchmark scenarios. Each scenario prepares one client per worker
+(setup) and then repeats an operation; an operation may issue several
+HTTP requests and counts as failed if any of them does.
+"""
+import random
+
+import requests
+
+from bench.stack import BENCH_PASSWORD
+
+
+class ScenarioError(Exception):
+    """
+    Raised by an operation whose response is not the expected one
+    """
+
+
+def expect(response, *status_codes):
+    if response.status_code not in status_codes:
+        raise ScenarioError(f'{response.request.method} {response.url}: {response.status_code}')
+    return response
+
+
+def web_login(stack, username, password):
+    client = requests.Session()
+    response = client.post(f'{stack.web_url}/login', data={'username': username, 'password': password},
+                           allow_redirects=False)
+    # A successful login redirects away from the login page
+    if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+        raise ScenarioError(f'login de {username} fallido')
+    return client
+
+
+def api_token(stack, username, password):
+    response = expect(requests.post(f'{stack.api_url}/auth/login',
+                                    json={'username': username, 'password': password}), 200)
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+
+class LoginStorm:
+    """
+    Web logins of random seeded users, each from a fresh client
+    """
+
+    name = 'login_storm'
+
+    def __init__(self, stack):
+        self.stack = stack
+
+    def setup(self, worker):
+        return None
+
+    def run(self, state):
+        _, username = random.choice(self.stack.users)
+        web_login(self.stack, username, BENCH_PASSWORD).close()
+
+
+class ChatTurnLoop:
+    """
+    Chat turns (bot reply and storage of both messages) on the user's own project
+    """
+
+    name = 'chat_turn'
+
+    def __init__(self, stack):
+        self.stack = stack
+
+    def setup(self, worker):
+        user_id, username = self.stack.users[worker % len(self.stack.users)]
+        return web_login(self.stack, username, BENCH_PASSWORD), self.stack.projects[user_id][0]
+
+    def run(self, state):
+        client, project_id = state
+        expect(client.post(f'{self.stack.web_url}/api/proyecto/{project_id}/turno',
+                           json={'message': 'Hola, ¿qué tal?'}), 200)
+
+
+class AdminListing:
+    """
+    The admin's user listing page, which walks every page of /users
+    """
+
+    name = 'admin_listing'
+
+    def __init__(self, stack):
+        self.stack = stack
+
+    def setup(self, worker):
+        return web_login(self.stack, 'admin', 'Admin123!')
+
+    def run(self, client):
+        expect(client.get(f'{self.stack.web_url}/usuarios', allow_redirects=False), 200)
+
+
+class ProjectCrud:
+    """
+    Create, read, update and delete of a project against the API
+    """
+
+    name = 'project_crud'
+
+    def __init__(self, stack):
+        self.stack = stack
+
+    def setup(self, worker):
+        _, username = self.stack.users[worker % len(self.stack.users)]
+        client = requests.Session()
+        client.headers.update(api_token(self.stack, username, BENCH_PASSWORD))
+        return client
+
+    def run(self, client):
+        url = f'{self.stack.api_url}/projects'
+        project = expect(client.post(url, json={'nombre': 'CRUD', 'descripcion': 'benchmark'}), 201).json()['project']
+        expect(client.get(f'{url}/{project["id"]}'), 200)
+        expect(client.put(f'{url}/{project["id"]}', json={'nombre': 'CRUD editado'}), 200)
+        expect(client.delete(f'{url}/{project["id"]}'), 200)
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (LoginStorm, ChatTurnLoop, AdminListing, ProjectCrud)}
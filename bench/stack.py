@@ -0,0 +1,128 @@
+"""
+Boots the API, chat and web apps in this process, each on its own local
+HTTP server, against a throwaway SQLite database (or DATABASE_URL).
+
+The apps read their configuration from the environment when imported, so
+everything here must run before the first import of api, chat or web.
+"""
+import logging
+import os
+import tempfile
+import threading
+
+from sqlalchemy import event, insert
+from werkzeug.serving import make_server
+
+BENCH_PASSWORD = 'Bench123!'
+
+
+class QueryCounter:
+    """
+    Counts the SQL statements sent to the API's database
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def __call__(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def read(self):
+        with self._lock:
+            return self.count
+
+
+class Stack:
+    def __init__(self, database_url=None, hash_rounds=None):
+        self.tmpdir = tempfile.mkdtemp(prefix='mndefender-bench-')
+        self.database_url = database_url or f'sqlite:///{os.path.join(self.tmpdir, "bench.db")}'
+        self.hash_rounds = hash_rounds
+        self.servers = []
+        self.queries = QueryCounter()
+        self.users = []  # (id, username) of the seeded users
+        self.projects = {}  # user id -> ids of their seeded projects
+
+    def _serve(self, app):
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}'
+
+    def start(self):
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+        os.environ['DATABASE_URL'] = self.database_url
+        os.environ.setdefault('API_INIT_MODE', 'eager')
+        if self.hash_rounds:
+            os.environ['PASSWORD_HASH_ROUNDS'] = str(self.hash_rounds)
+
+        from api.app import create_app, db
+        self.api_app = create_app()
+        with self.api_app.app_context():
+            self.db = db
+            self.dialect = db.engine.dialect.name
+            event.listen(db.engine, 'before_cursor_execute', self.queries)
+        self.api_url = self._serve(self.api_app)
+
+        from chat.app import app as chat_app
+        self.chat_url = self._serve(chat_app)
+
+        # The gateway reads the upstream URLs on import
+        os.environ['API_URL'] = self.api_url
+        os.environ['CHAT_URL'] = self.chat_url
+        from web.app import app as web_app
+        from web import gateway
+        web_app.config['SESSION_COOKIE_SECURE'] = False  # Plain HTTP on localhost
+        self.gateway = gateway
+        self.web_url = self._serve(web_app)
+        return self
+
+    def seed(self, users=100, projects=3, messages=10):
+        """
+        Inserts fake users, projects per user and messages per project.
+        Every seeded user shares one password hash, so seeding doesn't pay
+        for thousands of hashes.
+        """
+        from api.app import hasher
+        from api.models.user import User
+        from api.models.project import Project
+        from api.models.message import Message
+
+        with self.api_app.app_context():
+            db = self.db
+            password = hasher.hash_password(BENCH_PASSWORD)
+            db.session.execute(insert(User), [
+                {
+                    'nombre': f'Usuario {i}',
+                    'apellidos': 'Benchmark',
+                    'correo': f'bench{i}@example.com',
+                    'username': f'bench{i}',
+                    'password': password,
+                    'is_admin': False,
+                }
+                for i in range(users)
+            ])
+            self.users = db.session.query(User.id, User.username).filter(User.username.like('bench%')).all()
+
+            db.session.execute(insert(Project), [
+                {'nombre': f'Proyecto {i}', 'descripcion': 'Proyecto de benchmark', 'usuario_id': user_id}
+                for user_id, _ in self.users
+                for i in range(projects)
+            ])
+            owned = db.session.query(Project.id, Project.usuario_id).all()
+            for project_id, user_id in owned:
+                self.projects.setdefault(user_id, []).append(project_id)
+
+            if messages:
+                db.session.execute(insert(Message), [
+                    {'contenido': f'Mensaje {i}', 'es_bot': i % 2 == 1, 'proyecto_id': project_id}
+                    for project_id, _ in owned
+                    for i in range(messages)
+                ])
+            db.session.commit()
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
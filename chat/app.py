@@ -1,31 +1,22 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import random
+from services.registry import create_default_registry, UnknownEngineError
+from services import instrumentation
 import functools
+import json
 import os
 
 app = Flask(__name__)
 CORS(app)
 
+# Request ids, spans and /metrics
+instrumentation.init_app(app, 'chat')
+
 # API Key for simple authentication
 API_KEY = os.environ.get('CHAT_API_KEY', 'your-api-key')
 
-# Predefined responses for the chat
-responses = [
-    "¡Hola! ¿En qué puedo ayudarte hoy?",
-    "Muy bien, pero sabes que los gatos tienen 32 músculos en cada oreja.",
-    "No me importa porque yo sé que los osos polares son zurdos.",
-    "A qué tú no sabías que las abejas tienen 5 ojos.",
-    "¿Sabías que los elefantes son los únicos animales que no pueden saltar?",
-    "A mí me gusta saber que las jirafas tienen la lengua de color azul oscuro.",
-    "Te va a parecer increible pero ¿sabías que los pingüinos tienen rodillas?",
-    "¿Sabías que los cocodrilos no pueden sacar la lengua?",
-    "Hoy no tengo ganas de trabajar pero te diré que los flamencos son rosados por comer camarones.",
-    "No sé de qué me hablas pero yo sé que los perros son capaces de oír sonidos a 225 metros de distancia.",
-    "Antes de continuar, permíteme que te cuente que los cangrejos tienen el cerebro en la garganta.",
-    "Qué pereza, pero te diré que los ratones no pueden vomitar.",
-    "Cuéntame algo que no sepa, como que las mariposas saborean con sus patas."
-]
+# Response engines, loaded once at startup and shared by every request
+registry = create_default_registry()
 
 def require_api_key(view_function):
     @functools.wraps(view_function)
@@ -48,6 +39,21 @@ def require_api_key(view_function):
 
     return decorated_function
 
+def generate_reply(message, engine):
+    """
+    Yields the reply to a message chunk by chunk, as it is produced
+    """
+    yield from engine.stream_response(message)
+
+def select_engine(data):
+    """
+    Engine named in the request, or the one configured for its project
+    """
+    return registry.for_request(data.get('engine'), data.get('proyecto_id'))
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
 @app.route('/api/chat', methods=['POST'])
 @require_api_key
 def chat():
@@ -57,11 +63,53 @@ def chat():
     if not message:
         return jsonify({'error': 'No se proporcionó ningún mensaje'}), 400
 
-    # Generate a random response from the predefined list
-    response = random.choice(responses)
+    try:
+        engine = select_engine(data)
+    except UnknownEngineError:
+        return jsonify({'error': 'Motor de respuestas desconocido'}), 400
+
+    response = engine.get_response(message)
 
     return jsonify({'message': response})
 
+@app.route('/api/chat/stream', methods=['POST'])
+@require_api_key
+def chat_stream():
+    """
+    Same as /api/chat but sends the reply as Server-Sent Events:
+    one 'delta' event per chunk and a final 'done' event with the full text
+    """
+    data = request.get_json()
+    message = data.get('message', '')
+
+    if not message:
+        return jsonify({'error': 'No se proporcionó ningún mensaje'}), 400
+
+    try:
+        engine = select_engine(data)
+    except UnknownEngineError:
+        return jsonify({'error': 'Motor de respuestas desconocido'}), 400
+
+    def events():
+        chunks = []
+        try:
+            for chunk in generate_reply(message, engine):
+                chunks.append(chunk)
+                yield sse_event('delta', {'delta': chunk})
+            yield sse_event('done', {'message': ''.join(chunks)})
+        except Exception as e:
+            yield sse_event('error', {'error': f'Error al generar la respuesta: {str(e)}'})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/engines', methods=['GET'])
+def list_engines():
+    return jsonify({'engines': registry.names(), 'default': registry.default})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'ok', 'service': 'chat-microservice'})
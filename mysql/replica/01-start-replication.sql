@@ -0,0 +1,13 @@
+-- Follows the primary from the start of its binary log. The database and
+-- user created by the image's entrypoint are not logged, so each server
+-- creates its own and only the application's tables and rows replicate.
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST = 'db',
+    SOURCE_PORT = 3306,
+    SOURCE_USER = 'root',
+    SOURCE_PASSWORD = 'root_seguro',
+    SOURCE_AUTO_POSITION = 1,
+    SOURCE_CONNECT_RETRY = 5,
+    GET_SOURCE_PUBLIC_KEY = 1;
+
+START REPLICA;
@@ -1,4 +1,10 @@
-from web.app import app as web_app
+from services.server import serve
+
+
+def load_app():
+    from web.app import app as web_app
+    return web_app
+
 
 if __name__ == '__main__':
-    web_app.run(debug=True)
+    serve('web', load_app, port=5000)
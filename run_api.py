@@ -1,6 +1,5 @@
 from api.app import create_app
-
-app = create_app()
+from services.server import serve
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    serve('api', create_app, port=5001)
@@ -1,4 +1,10 @@
-from chat.app import app
+from services.server import serve
+
+
+def load_app():
+    from chat.app import app
+    return app
+
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5002)
+    serve('chat', load_app, port=5002)
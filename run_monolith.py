@@ -0,0 +1,29 @@
+import os
+
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+
+from services.server import serve
+
+# The web app calls the API and the chat service in-process; they are
+# also mounted under these prefixes for clients outside this process
+API_PREFIX = os.environ.get('MONOLITH_API_PREFIX', '/services/api')
+CHAT_PREFIX = os.environ.get('MONOLITH_CHAT_PREFIX', '/services/chat')
+
+
+def create_app():
+    from api.app import create_app as create_api_app
+    from chat.app import app as chat_app
+    from web import gateway
+    from web.app import app as web_app
+
+    api_app = create_api_app()
+    gateway.dispatch_in_process({'api': api_app, 'chat': chat_app})
+
+    return DispatcherMiddleware(web_app, {
+        API_PREFIX: api_app,
+        CHAT_PREFIX: chat_app,
+    })
+
+
+if __name__ == '__main__':
+    serve('monolith', create_app, port=5000)
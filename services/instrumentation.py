@@ -0,0 +1,290 @@
+"""
+Request tracing and latency histograms shared by the web, api and chat services.
+
+Every request gets an id (taken from the X-Request-ID header or generated)
+that is forwarded on upstream calls, so one page load can be followed
+through the three services. While a request runs, its handler time, each
+upstream HTTP call and each SQL statement are recorded as spans: they feed
+per-name histograms served at /metrics, and requests slower than
+SLOW_REQUEST_MS are logged with their slowest spans.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Requests slower than this (milliseconds) are logged with their spans
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 1000))
+
+# Histogram bucket upper bounds, in milliseconds
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+logger = logging.getLogger('instrumentation')
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# Incoming ids are only reused if they look like one
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class Histogram:
+    """
+    Thread-safe latency histogram with fixed buckets
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            count, total_ms, max_ms = self.count, self.total_ms, self.max_ms
+
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(list(BUCKETS_MS) + ['+Inf'], counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            'count': count,
+            'sum_ms': total_ms,
+            'avg_ms': total_ms / count if count else 0.0,
+            'max_ms': max_ms,
+            'buckets': buckets,
+        }
+
+
+class Metrics:
+    """
+    Histograms of a service, keyed by span kind (handler, upstream, sql) and name
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, kind, name, elapsed_ms):
+        key = (kind, name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        histogram.observe(elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            items = sorted(self.histograms.items())
+        metrics = {}
+        for (kind, name), histogram in items:
+            metrics.setdefault(kind, {})[name] = histogram.snapshot()
+        return metrics
+
+    def prometheus(self, service):
+        """
+        The histograms in Prometheus' text exposition format
+        """
+        lines = ['# TYPE span_duration_ms histogram']
+        for kind, histograms in self.snapshot().items():
+            for name, histogram in histograms.items():
+                labels = f'service="{service}",kind="{kind}",name="{name}"'
+                for bound, count in histogram['buckets'].items():
+                    lines.append(f'span_duration_ms_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'span_duration_ms_sum{{{labels}}} {histogram["sum_ms"]}')
+                lines.append(f'span_duration_ms_count{{{labels}}} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Spans recorded outside of any traced request
+background_metrics = Metrics()
+
+
+class Trace:
+    """
+    Spans recorded while serving one request
+    """
+
+    def __init__(self, request_id, metrics):
+        self.request_id = request_id
+        self.metrics = metrics
+        self.started_at = time.perf_counter()
+        self.spans = []
+        self.status_code = None
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started_at) * 1000
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def propagation_headers(headers=None):
+    """
+    Request headers extended with the current request id, for upstream calls
+    """
+    request_id = current_request_id()
+    if request_id is None:
+        return headers
+    return {**(headers or {}), REQUEST_ID_HEADER: request_id}
+
+
+def record_span(kind, name, elapsed_ms):
+    """
+    Adds a span to the current request and to its service's histograms
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        background_metrics.observe(kind, name, elapsed_ms)
+        return
+    trace.metrics.observe(kind, name, elapsed_ms)
+    trace.spans.append((kind, name, elapsed_ms))
+
+
+# Numeric path segments are collapsed so that /projects/7 and /projects/8 share a histogram
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+_SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+[`"]?(\w+)', re.IGNORECASE)
+
+
+def path_template(path):
+    return _ID_SEGMENT.sub('/{id}', path.split('?', 1)[0])
+
+
+def statement_name(statement):
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'SQL'
+    table = _SQL_TABLE.search(statement)
+    return f'{verb} {table.group(1)}' if table else verb
+
+
+def instrument_engine(engine):
+    """
+    Records a span for every SQL statement executed through the engine
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('span_starts', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        started_at = conn.info['span_starts'].pop()
+        record_span('sql', statement_name(statement), (time.perf_counter() - started_at) * 1000)
+
+    @event.listens_for(engine, 'handle_error')
+    def failed_statement(exception_context):
+        starts = exception_context.connection.info.get('span_starts') if exception_context.connection else None
+        if starts:
+            starts.pop()
+
+
+def start_trace(metrics, request_id=None):
+    if not request_id or not _VALID_REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+    trace = Trace(request_id, metrics)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(service, handler, status_code=None):
+    """
+    Records the handler span of the current request and logs it if slow
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    _current_trace.set(None)
+
+    elapsed_ms = trace.elapsed_ms()
+    trace.metrics.observe('handler', handler, elapsed_ms)
+    if elapsed_ms >= SLOW_REQUEST_MS:
+        slowest = sorted(trace.spans, key=lambda span: span[2], reverse=True)[:5]
+        logger.warning(
+            '%s %s petición lenta %s: %.1f ms (estado %s); spans más lentos: %s',
+            service, handler, trace.request_id, elapsed_ms, status_code,
+            ', '.join(f'{kind} {name} {span_ms:.1f} ms' for kind, name, span_ms in slowest) or 'ninguno'
+        )
+
+
+def _begin_request(metrics, request):
+    start_trace(metrics, request.headers.get(REQUEST_ID_HEADER))
+
+
+def _tag_response(response):
+    trace = _current_trace.get()
+    if trace is not None:
+        response.headers[REQUEST_ID_HEADER] = trace.request_id
+        trace.status_code = response.status_code
+    return response
+
+
+def _end_request(service, request, exception):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    status_code = trace.status_code or (500 if exception else None)
+    rule = request.url_rule.rule if request.url_rule else '<sin ruta>'
+    finish_trace(service, f'{request.method} {rule}', status_code)
+
+
+def _metrics_response(app, service, metrics, request):
+    if request.args.get('format') == 'prometheus':
+        return app.response_class(metrics.prometheus(service), mimetype='text/plain; version=0.0.4')
+    return {'service': service, 'spans': metrics.snapshot()}
+
+
+def init_app(app, service):
+    """
+    Traces every request of a Flask app and serves /metrics
+    """
+    from flask import request
+
+    metrics = app.extensions['instrumentation'] = Metrics()
+    app.before_request(lambda: _begin_request(metrics, request))
+    app.after_request(_tag_response)
+    app.teardown_request(lambda exception=None: _end_request(service, request, exception))
+    app.add_url_rule('/metrics', 'metrics', lambda: _metrics_response(app, service, metrics, request), methods=['GET'])
+
+
+def init_async_app(app, service):
+    """
+    Quart version of init_app. The hooks are coroutines so that the trace
+    is set in the request's own context, not in a worker thread's.
+    """
+    from quart import request
+
+    metrics = app.extensions['instrumentation'] = Metrics()
+
+    async def begin_request_trace():
+        _begin_request(metrics, request)
+
+    async def tag_response(response):
+        return _tag_response(response)
+
+    async def end_request_trace(exception=None):
+        _end_request(service, request, exception)
+
+    async def metrics_view():
+        return _metrics_response(app, service, metrics, request)
+
+    app.before_request(begin_request_trace)
+    app.after_request(tag_response)
+    app.teardown_request(end_request_trace)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
@@ -0,0 +1,81 @@
+import os
+
+from services.message_service import (
+    AnimalFactsService,
+    ChatResponsesService,
+    GreetingMessageService,
+    RandomMessageService,
+)
+
+class UnknownEngineError(KeyError):
+    """
+    Raised when a request asks for an engine that is not registered
+    """
+
+class MessageServiceRegistry:
+    """
+    Registry of response engines, built once per process at startup.
+
+    Engines are stateless, so a single shared instance of each one serves
+    every request. The engine for a request is, in order: the one named in
+    the request, the one configured for its project, or the default.
+    """
+
+    def __init__(self, default=None):
+        self._engines = {}
+        self._project_engines = {}
+        self.default = default
+
+    def register(self, name, engine):
+        self._engines[name] = engine
+        if self.default is None:
+            self.default = name
+        return engine
+
+    def assign_project(self, proyecto_id, name):
+        if name not in self._engines:
+            raise UnknownEngineError(name)
+        self._project_engines[int(proyecto_id)] = name
+
+    def get(self, name):
+        try:
+            return self._engines[name]
+        except KeyError:
+            raise UnknownEngineError(name)
+
+    def names(self):
+        return list(self._engines)
+
+    def for_request(self, engine=None, proyecto_id=None):
+        if engine:
+            return self.get(engine)
+        if proyecto_id is not None:
+            try:
+                name = self._project_engines.get(int(proyecto_id))
+            except (TypeError, ValueError):
+                name = None
+            if name:
+                return self.get(name)
+        return self.get(self.default)
+
+def create_default_registry():
+    """
+    Registers the built-in engines and applies the environment configuration:
+    CHAT_DEFAULT_ENGINE=<name> and CHAT_PROJECT_ENGINES=<proyecto_id>:<name>,...
+    """
+    registry = MessageServiceRegistry()
+    registry.register('chat', ChatResponsesService())
+    registry.register('aleatorio', RandomMessageService())
+    registry.register('saludos', GreetingMessageService())
+    registry.register('animales', AnimalFactsService())
+
+    default = os.environ.get('CHAT_DEFAULT_ENGINE')
+    if default:
+        registry.get(default)
+        registry.default = default
+
+    for assignment in filter(None, os.environ.get('CHAT_PROJECT_ENGINES', '').split(',')):
+        proyecto_id, name = assignment.split(':', 1)
+        registry.assign_project(proyecto_id.strip(), name.strip())
+
+    return registry
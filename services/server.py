@@ -0,0 +1,100 @@
+"""
+Launcher shared by the run_*.py entry points.
+
+By default a service runs under gunicorn: a pre-fork server whose master
+loads the app once (preload) and forks the workers from it, so code and
+read-only tables are shared copy-on-write. Workers are recycled after
+max_requests requests (plus a random jitter so they don't all restart at
+once), and SIGHUP to the master replaces them gracefully.
+
+--debug starts Flask's development server (reloader and debugger) instead.
+It must be asked for explicitly and never serves more than one process.
+"""
+import argparse
+import multiprocessing
+import os
+
+
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+def parse_args(service, port, argv=None):
+    parser = argparse.ArgumentParser(description=f'Arranca el servicio {service}')
+    parser.add_argument('--debug', action='store_true',
+                        help='servidor de desarrollo de Flask con recarga y depurador (no usar en producción)')
+    parser.add_argument('--bind', default=os.environ.get('SERVER_BIND', f'127.0.0.1:{port}'),
+                        help=f'dirección de escucha (SERVER_BIND, por defecto 127.0.0.1:{port})')
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('SERVER_WORKERS', multiprocessing.cpu_count() + 1)),
+                        help='procesos worker (SERVER_WORKERS, por defecto núcleos + 1)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVER_THREADS', 4)),
+                        help='hilos por worker (SERVER_THREADS, por defecto 4)')
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('SERVER_MAX_REQUESTS', 1000)),
+                        help='peticiones tras las que se recicla un worker, 0 para no reciclar (SERVER_MAX_REQUESTS)')
+    parser.add_argument('--max-requests-jitter', type=int,
+                        default=int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 100)),
+                        help='margen aleatorio sobre --max-requests (SERVER_MAX_REQUESTS_JITTER)')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('SERVER_TIMEOUT', 30)),
+                        help='segundos sin respuesta antes de reiniciar un worker (SERVER_TIMEOUT)')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30)),
+                        help='segundos para terminar las peticiones en curso al recargar o parar (SERVER_GRACEFUL_TIMEOUT)')
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        default=env_flag('SERVER_PRELOAD', 'true'),
+                        help='cargar la aplicación en cada worker en lugar de en el master (SERVER_PRELOAD=false)')
+    parser.add_argument('--pid', default=os.environ.get('SERVER_PIDFILE'),
+                        help='fichero con el PID del master, para enviarle SIGHUP (SERVER_PIDFILE)')
+    return parser.parse_args(argv)
+
+
+def gunicorn_options(args):
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests_jitter,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'preload_app': args.preload,
+        'pidfile': args.pid,
+        'accesslog': os.environ.get('SERVER_ACCESS_LOG'),
+    }
+
+
+def run_gunicorn(load_app, options):
+    # Imported here so --debug also works where gunicorn isn't available (Windows)
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return load_app()
+
+    Server().run()
+
+
+def run_debug(app, bind):
+    host, _, port = bind.rpartition(':')
+    if hasattr(app, 'run'):
+        app.run(host=host or None, port=int(port), debug=True)
+    else:
+        from werkzeug.serving import run_simple
+        run_simple(host or 'localhost', int(port), app, use_reloader=True, use_debugger=True, threaded=True)
+
+
+def serve(service, load_app, port, argv=None):
+    """
+    Runs the app returned by load_app: under gunicorn, or with the
+    development server when --debug is given
+    """
+    args = parse_args(service, port, argv)
+    if args.debug:
+        run_debug(load_app(), args.bind)
+    else:
+        run_gunicorn(load_app, gunicorn_options(args))
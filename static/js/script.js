@@ -1,4 +1,20 @@
+// Recibir las respuestas del bot en streaming (Server-Sent Events) cuando el navegador lo soporta
+const STREAMING_ENABLED = typeof ReadableStream !== 'undefined' && typeof TextDecoder !== 'undefined';
+
+// Instante (segundos Unix) hasta el que la web debe leer de la base de datos principal.
+// Llega al final de un turno en streaming y se devuelve en la siguiente petición.
+let dbStickyUntil = null;
+
+// Cabeceras con el instante pendiente de devolver a la web, si aún no ha pasado
+function stickyHeaders(headers = {}) {
+    const until = dbStickyUntil;
+    dbStickyUntil = null;
+    if (!until || until <= Date.now() / 1000) return headers;
+    return { ...headers, "X-DB-Sticky-Until": String(until) };
+}
+
 // Función para crear y añadir mensajes al chat en el html
+// Devuelve el elemento con el texto del mensaje para poder ampliarlo después
 function createChatMessage(messageText, isFromBot) {
     if (!messageText) {
         console.error("Se intentó crear un mensaje con texto vacío o inválido");
@@ -22,7 +38,7 @@ function createChatMessage(messageText, isFromBot) {
                 messageContentElement.textContent = messageText;
                 chatContainer.appendChild(messageElement);
                 chatContainer.scrollTop = chatContainer.scrollHeight;
-                return;
+                return messageContentElement;
             }
         } catch (error) {
             console.error("Error con la plantilla:", error);
@@ -64,6 +80,69 @@ function createChatMessage(messageText, isFromBot) {
 
     chatContainer.appendChild(messageDiv);
     chatContainer.scrollTop = chatContainer.scrollHeight;
+    return messageDiv.querySelector('p');
+}
+
+// Función para añadir texto a un mensaje ya mostrado (respuestas en streaming)
+function appendToChatMessage(messageElement, text) {
+    if (!messageElement || !text) return;
+
+    messageElement.textContent += text;
+    const chatContainer = document.getElementById('chat-messages');
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+}
+
+// Función para recibir la respuesta del bot en streaming y mostrarla según llega
+async function streamBotResponse(proyectoId, messageText) {
+    const res = await fetch(`/api/proyecto/${proyectoId}/turno/stream`, {
+        method: "POST",
+        headers: stickyHeaders({ "Content-Type": "application/json" }),
+        body: JSON.stringify({ message: messageText })
+    });
+
+    if (!res.ok || !res.body) throw new Error(`Error en la respuesta del chatbot: ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let botMessage = null;
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // Cada evento SSE termina con una línea en blanco
+        let separator;
+        while ((separator = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (!data) continue;
+
+            const payload = JSON.parse(data);
+            if (eventName === 'delta') {
+                if (!botMessage) {
+                    botMessage = createChatMessage(payload.delta, true);
+                } else {
+                    appendToChatMessage(botMessage, payload.delta);
+                }
+            } else if (eventName === 'stored') {
+                dbStickyUntil = payload.sticky_until || null;
+            } else if (eventName === 'error') {
+                throw new Error(payload.error);
+            }
+        }
+    }
+
+    if (!botMessage) throw new Error("El chatbot no devolvió ninguna respuesta");
 }
 
 
@@ -100,46 +179,25 @@ async function handleMessageSend(event = null) {
     userInput.value = '';
 
     try {
-        // Guardar mensaje del usuario
-        const res = await fetch("/api/mensaje", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                contenido: messageText,
-                es_bot: false,
-                proyecto_id: proyectoId
-            })
-        });
-
-        if (!res.ok) throw new Error(`Error al guardar el mensaje: ${res.status}`);
+        if (STREAMING_ENABLED) {
+            await streamBotResponse(proyectoId, messageText);
+            return;
+        }
 
-        // Enviar mensaje al chatbot
-        const botResponse = await fetch("/send-message", {
+        // Un único viaje de ida y vuelta: respuesta del bot y guardado de ambos mensajes
+        const res = await fetch(`/api/proyecto/${proyectoId}/turno`, {
             method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                message: messageText,
-                proyecto_id: proyectoId
-            })
+            headers: stickyHeaders({ "Content-Type": "application/json" }),
+            body: JSON.stringify({ message: messageText })
         });
 
-        if (!botResponse.ok) throw new Error("Error en la respuesta del chatbot");
+        if (!res.ok) throw new Error(`Error en la respuesta del chatbot: ${res.status}`);
 
-        const data = await botResponse.json();
+        const data = await res.json();
 
-        // Mostrar y guardar respuesta del bot
+        // Mostrar respuesta del bot
         if (data && data.message) {
             createChatMessage(data.message, true);
-
-            await fetch("/api/mensaje", {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({
-                    contenido: data.message,
-                    es_bot: true,
-                    proyecto_id: proyectoId
-                })
-            });
         }
     } catch (error) {
         console.error("Error:", error);
@@ -161,10 +219,12 @@ async function cargarMensajesProyecto(id) {
         chatContainer.innerHTML = '';
 
         // Obtener mensajes
-        const res = await fetch(`/api/proyecto/${id}/mensajes`);
+        const res = await fetch(`/api/proyecto/${id}/mensajes`, { headers: stickyHeaders() });
         if (!res.ok) throw new Error(`Error: ${res.status}`);
 
-        const mensajes = await res.json();
+        // La API devuelve el historial más reciente ya ordenado cronológicamente
+        const data = await res.json();
+        const mensajes = data.messages || [];
 
         if (!mensajes || mensajes.length === 0) {
             createChatMessage("Hola, soy un bot. ¿En qué puedo ayudarte con este proyecto?", true);
@@ -179,9 +239,6 @@ async function cargarMensajesProyecto(id) {
                 })
             });
         } else {
-            // Ordenar mensajes por fecha
-            mensajes.sort((a, b) => new Date(a.fecha_creacion) - new Date(b.fecha_creacion));
-
             mensajes.forEach(msg => {
                 // Normalizar es_bot a booleano
                 let isBot = Boolean(msg.es_bot);
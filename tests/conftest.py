@@ -0,0 +1,29 @@
+import pytest
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """
+    Test client of a fresh API app on its own SQLite database, seeded with
+    the default admin and user accounts
+    """
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "api.db"}')
+    monkeypatch.setenv('PASSWORD_HASH_ROUNDS', '1000')
+    from api.app import create_app
+    return create_app().test_client()
+
+
+def login(client, username, password):
+    response = client.post('/auth/login', json={'username': username, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+
+
+@pytest.fixture
+def admin(api):
+    return login(api, 'admin', 'Admin123!')
+
+
+@pytest.fixture
+def user(api):
+    return login(api, 'user', 'User123!')
@@ -0,0 +1,115 @@
+def new_user(index, **fields):
+    return {
+        'username': f'lote{index}',
+        'nombre': f'Nombre{index}',
+        'apellidos': 'Apellidos',
+        'correo': f'lote{index}@example.com',
+        'password': 'Passw0rd!',
+        **fields
+    }
+
+
+def user_id(api, admin, username):
+    users = api.get('/users', headers=admin).get_json()['users']
+    return next(user['id'] for user in users if user['username'] == username)
+
+
+def statuses(response):
+    assert response.status_code == 200, response.get_json()
+    return [result['status'] for result in response.get_json()['results']]
+
+
+def test_user_batch_create_reports_each_item(api, admin):
+    response = api.post('/users:batch', headers=admin, json={'users': [
+        new_user(0),
+        new_user(1, username='admin'),
+        new_user(2, correo=None),
+        new_user(3, correo='lote0@example.com'),
+        new_user(4),
+    ]})
+
+    assert statuses(response) == [201, 409, 400, 409, 201]
+    data = response.get_json()
+    assert (data['succeeded'], data['failed']) == (2, 3)
+    assert [result['user']['username'] for result in data['results'] if result['status'] == 201] == ['lote0', 'lote4']
+
+    # The created users can log in with their passwords
+    assert api.post('/auth/login', json={'username': 'lote4', 'password': 'Passw0rd!'}).status_code == 200
+
+
+def test_user_batch_requires_admin(api, admin, user):
+    assert api.post('/users:batch', headers=user, json={'users': [new_user(0)]}).status_code >= 400
+    assert 'lote0' not in {user['username'] for user in api.get('/users', headers=admin).get_json()['users']}
+
+
+def test_malformed_batches_are_rejected(api, admin):
+    assert api.post('/users:batch', headers=admin, json={'users': []}).status_code == 400
+    assert api.post('/users:batch', headers=admin, json={'users': ['x']}).status_code == 400
+    assert api.delete('/users:batch', headers=admin, json={'ids': ['1']}).status_code == 400
+    assert api.post('/projects:batch', headers=admin, json={'projects': [{}] * 501}).status_code == 400
+
+
+def test_user_batch_update(api, admin):
+    user = user_id(api, admin, 'user')
+    response = api.patch('/users:batch', headers=admin, json={'users': [
+        {'id': user, 'nombre': 'Cambiado'},
+        {'id': 999, 'nombre': 'Nadie'},
+        {'id': user, 'username': 'admin'},
+    ]})
+
+    assert statuses(response) == [200, 404, 409]
+    assert api.get(f'/users/{user}', headers=admin).get_json()['user']['nombre'] == 'Cambiado'
+
+
+def test_user_batch_delete_keeps_project_owners(api, admin, user):
+    api.post('/users:batch', headers=admin, json={'users': [new_user(0)]})
+    owner = user_id(api, admin, 'user')
+    removable = user_id(api, admin, 'lote0')
+    caller = user_id(api, admin, 'admin')
+    api.post('/projects', headers=user, json={'nombre': 'Proyecto'})
+
+    response = api.delete('/users:batch', headers=admin, json={'ids': [removable, owner, caller, 999]})
+
+    assert statuses(response) == [200, 409, 403, 404]
+    usernames = {user['username'] for user in api.get('/users', headers=admin).get_json()['users']}
+    assert usernames == {'admin', 'user'}
+
+
+def test_project_batch_create_reads_back_each_row(api, admin, user):
+    owner = user_id(api, admin, 'user')
+    response = api.post('/projects:batch', headers=user, json={'projects': [
+        {'nombre': 'Igual', 'descripcion': 'd'},
+        {'descripcion': 'sin nombre'},
+        {'nombre': 'Igual', 'descripcion': 'd'},
+        {'nombre': 'Ajeno', 'usuario_id': user_id(api, admin, 'admin')},
+        {'nombre': 'Otro'},
+    ]})
+
+    assert statuses(response) == [201, 400, 201, 403, 201]
+    created = [result['project'] for result in response.get_json()['results'] if result['status'] == 201]
+    assert [project['nombre'] for project in created] == ['Igual', 'Igual', 'Otro']
+    assert all(project['usuario_id'] == owner for project in created)
+    assert 'clave_lote' not in created[0]
+
+    # Identical items still get distinct rows, in input order
+    ids = [project['id'] for project in created]
+    assert ids == sorted(set(ids))
+    listed = api.get('/projects', headers=user).get_json()['projects']
+    assert [project['id'] for project in listed] == ids
+
+
+def test_project_batch_update_and_delete(api, admin, user):
+    own = api.post('/projects', headers=user, json={'nombre': 'Mío'}).get_json()['project']['id']
+    other = api.post('/projects', headers=admin, json={'nombre': 'Ajeno'}).get_json()['project']['id']
+
+    response = api.patch('/projects:batch', headers=user, json={'projects': [
+        {'id': own, 'nombre': 'Renombrado'},
+        {'id': other, 'nombre': 'No'},
+        {'id': own, 'usuario_id': user_id(api, admin, 'admin')},
+    ]})
+    assert statuses(response) == [200, 403, 403]
+    assert response.get_json()['results'][0]['project']['nombre'] == 'Renombrado'
+
+    response = api.delete('/projects:batch', headers=user, json={'ids': [own, other, 999]})
+    assert statuses(response) == [200, 403, 404]
+    assert [project['id'] for project in api.get('/projects', headers=admin).get_json()['projects']] == [other]
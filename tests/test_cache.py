@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from web import cache as cache_module
+from web.cache import StaleWhileRevalidateCache
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, 'time', clock)
+    return clock
+
+
+class Loader:
+    """
+    Returns 'v1', 'v2', ... on successive calls; can be held until released
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        value = f'v{self.calls}'
+        self.release.wait(5)
+        return value
+
+
+def wait_for_background(cache, finished, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        stats = cache.stats()
+        if stats['refreshes'] + stats['refresh_errors'] >= finished:
+            return
+        assert time.monotonic() < deadline, 'la recarga en segundo plano no terminó'
+        time.sleep(0.001)
+
+
+def test_fresh_entry_is_served_without_loading(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    loader = Loader()
+    assert cache.get('1', loader) == 'v1'
+    clock.advance(10)
+    assert cache.get('1', loader) == 'v1'
+    assert loader.calls == 1
+
+
+def test_stale_entry_is_served_and_refreshed(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    loader = Loader()
+    cache.get('1', loader)
+    clock.advance(31)
+    assert cache.get('1', loader) == 'v1'
+    wait_for_background(cache, 1)
+    assert cache.get('1', loader) == 'v2'
+    assert cache.stats()['stale_hits'] == 1
+
+
+def test_failed_refresh_keeps_serving_until_max_stale(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    cache.get('1', lambda: 'v1')
+
+    def failing():
+        raise ConnectionError()
+
+    clock.advance(31)
+    assert cache.get('1', failing) == 'v1'
+    wait_for_background(cache, 1)
+    assert cache.stats()['refresh_errors'] == 1
+
+    clock.advance(600)
+    with pytest.raises(ConnectionError):
+        cache.get('1', failing)
+
+
+def test_invalidation_forces_the_next_get_to_load(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    loader = Loader()
+    cache.get('1', loader)
+    cache.invalidate('1')
+    assert cache.get('1', loader) == 'v2'
+
+
+def test_invalidation_discards_a_refresh_already_running(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    loader = Loader()
+    cache.get('1', loader)
+    clock.advance(31)
+
+    # The background reload started before the write still returns the old list
+    loader.release.clear()
+    assert cache.get('1', loader) == 'v1'
+    cache.invalidate('1')
+    loader.release.set()
+    wait_for_background(cache, 1)
+
+    assert cache.get('1', loader) == 'v3'
+    assert loader.calls == 3
+
+
+def test_invalidate_where_matches_values(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    cache.get('1', lambda: [{'id': 7}])
+    cache.get('2', lambda: [{'id': 8}])
+    assert cache.invalidate_where(lambda key, projects: any(p['id'] == 7 for p in projects)) == 1
+    assert cache.get('2', lambda: []) == [{'id': 8}]
+    assert cache.get('1', lambda: []) == []
+
+
+def test_entries_older_than_not_before_are_reloaded(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    loader = Loader()
+    cache.get('1', loader)
+    changed_at = clock() + 1
+    clock.advance(2)
+    assert cache.get('1', loader, not_before=changed_at) == 'v2'
+    assert cache.get('1', loader, not_before=changed_at) == 'v2'
+
+
+def test_async_invalidation_discards_a_refresh_already_running(clock):
+    async def scenario():
+        cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+        release = asyncio.Event()
+        release.set()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            value = f'v{len(calls)}'
+            await release.wait()
+            return value
+
+        first = await cache.aget('1', loader)
+        clock.advance(31)
+        release.clear()
+        stale = await cache.aget('1', loader)
+        await asyncio.sleep(0)
+        cache.invalidate('1')
+        release.set()
+        await asyncio.sleep(0.01)
+        return first, stale, await cache.aget('1', loader), len(calls)
+
+    assert asyncio.run(scenario()) == ('v1', 'v1', 'v3', 3)
+
+
+def test_async_prefetch_fills_the_cache(clock):
+    async def scenario():
+        cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+
+        async def loader():
+            return 'v1'
+
+        cache.aprefetch('1', loader)
+        while cache.stats()['loading']:
+            await asyncio.sleep(0)
+        return await cache.aget('1', loader), cache.stats()
+
+    value, stats = asyncio.run(scenario())
+    assert value == 'v1'
+    assert stats['hits'] == 1 and stats['misses'] == 0
+
+
+def test_concurrent_misses_share_one_load(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    loader = Loader()
+    loader.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('1', loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + 5
+    while cache.stats()['misses'] < 8:
+        assert time.monotonic() < deadline, 'las peticiones no llegaron a la caché'
+        time.sleep(0.001)
+    loader.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ['v1'] * 8
+    assert loader.calls == 1
+    assert cache.stats()['shared_loads'] == 7
+
+
+def test_miss_after_not_before_skips_an_older_load(clock):
+    cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+    loader = Loader()
+    loader.release.clear()
+    first = threading.Thread(target=cache.get, args=('1', loader))
+    first.start()
+    deadline = time.monotonic() + 5
+    while loader.calls < 1:
+        assert time.monotonic() < deadline, 'la primera carga no empezó'
+        time.sleep(0.001)
+
+    # A change made after that load started needs a load of its own
+    clock.advance(1)
+    loader.release.set()
+    assert cache.get('1', loader, not_before=clock()) == 'v2'
+    first.join(5)
+    assert loader.calls == 2
+
+
+def test_async_concurrent_misses_share_one_load(clock):
+    async def scenario():
+        cache = StaleWhileRevalidateCache(ttl=30, max_stale=600)
+        release = asyncio.Event()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await release.wait()
+            return f'v{len(calls)}'
+
+        waiting = asyncio.gather(*(cache.aget('1', loader) for _ in range(8)))
+        await asyncio.sleep(0)
+        release.set()
+        return await waiting, len(calls), cache.stats()['shared_loads']
+
+    assert asyncio.run(scenario()) == (['v1'] * 8, 1, 7)
@@ -0,0 +1,70 @@
+def etag_of(response):
+    return response.headers['ETag']
+
+
+def revalidate(api, url, headers, etag, **kwargs):
+    return api.get(url, headers={**headers, 'If-None-Match': etag}, **kwargs)
+
+
+def test_unchanged_project_is_not_modified(api, user):
+    project = api.post('/projects', headers=user, json={'nombre': 'p'}).get_json()['project']
+    url = f'/projects/{project["id"]}'
+    etag = etag_of(api.get(url, headers=user))
+
+    response = revalidate(api, url, user, etag)
+    assert response.status_code == 304
+    assert etag_of(response) == etag
+
+
+def test_every_edit_changes_the_validator(api, user):
+    project = api.post('/projects', headers=user, json={'nombre': 'p'}).get_json()['project']
+    url = f'/projects/{project["id"]}'
+    etags = [etag_of(api.get(url, headers=user))]
+
+    # Two edits within the same second must still produce different validators
+    for name in ('p1', 'p2'):
+        assert api.put(url, headers=user, json={'nombre': name}).status_code == 200
+        etags.append(etag_of(api.get(url, headers=user)))
+
+    assert len(set(etags)) == 3
+    response = revalidate(api, url, user, etags[0])
+    assert response.status_code == 200
+    assert response.get_json()['project']['nombre'] == 'p2'
+
+
+def test_edit_bumps_the_row_version(api, user):
+    from api.models.project import Project
+    project_id = api.post('/projects', headers=user, json={'nombre': 'p'}).get_json()['project']['id']
+    api.put(f'/projects/{project_id}', headers=user, json={'nombre': 'p1'})
+    api.put(f'/projects/{project_id}', headers=user, json={'descripcion': 'd'})
+
+    with api.application.app_context():
+        assert Project.query.get(project_id).version == 3
+
+
+def test_list_validator_follows_its_page(api, user):
+    ids = [api.post('/projects', headers=user, json={'nombre': f'p{index}'}).get_json()['project']['id']
+           for index in range(3)]
+    page = {'limit': 2}
+    etag = etag_of(api.get('/projects', headers=user, query_string=page))
+    assert revalidate(api, '/projects', user, etag, query_string=page).status_code == 304
+
+    # An edit of a row in the page
+    api.put(f'/projects/{ids[0]}', headers=user, json={'nombre': 'editado'})
+    response = revalidate(api, '/projects', user, etag, query_string=page)
+    assert response.status_code == 200
+    etag = etag_of(response)
+
+    # Deleting the only row after the page clears its next_cursor
+    api.delete(f'/projects/{ids[2]}', headers=user)
+    response = revalidate(api, '/projects', user, etag, query_string=page)
+    assert response.status_code == 200
+    assert response.get_json()['next_cursor'] is None
+
+
+def test_user_validators_change_on_edit(api, admin):
+    row_etag = etag_of(api.get('/users/2', headers=admin))
+    list_etag = etag_of(api.get('/users', headers=admin))
+    api.put('/users/2', headers=admin, json={'nombre': 'Otro'})
+    assert revalidate(api, '/users/2', admin, row_etag).status_code == 200
+    assert revalidate(api, '/users', admin, list_etag).status_code == 200
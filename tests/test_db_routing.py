@@ -0,0 +1,61 @@
+import shutil
+import time
+
+import pytest
+
+from tests.conftest import login
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """
+    API app whose replica is a snapshot of the primary taken right after
+    seeding, so rows written later only exist on the primary
+    """
+    primary = tmp_path / 'primary.db'
+    replica = tmp_path / 'replica.db'
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{primary}')
+    monkeypatch.setenv('PASSWORD_HASH_ROUNDS', '1000')
+    from api.app import create_app
+    create_app()
+
+    shutil.copy(primary, replica)
+    monkeypatch.setenv('DATABASE_REPLICA_URL', f'sqlite:///{replica}')
+    return create_app().test_client()
+
+
+def project_names(client, headers):
+    response = client.get('/projects', headers=headers)
+    assert response.status_code == 200
+    return [project['nombre'] for project in response.get_json()['projects']]
+
+
+def test_reads_go_to_the_replica(replicated):
+    headers = login(replicated, 'user', 'User123!')
+    response = replicated.post('/projects', headers=headers, json={'nombre': 'Nuevo'})
+    assert response.status_code == 201
+
+    # Without the sticky header the read is served by the stale replica
+    assert project_names(replicated, headers) == []
+
+
+def test_writer_reads_its_writes_from_the_primary(replicated):
+    headers = login(replicated, 'user', 'User123!')
+    response = replicated.post('/projects', headers=headers, json={'nombre': 'Nuevo'})
+    sticky_until = response.headers['X-DB-Sticky-Until']
+    assert float(sticky_until) > time.time()
+
+    assert project_names(replicated, {**headers, 'X-DB-Sticky-Until': sticky_until}) == ['Nuevo']
+
+
+def test_expired_or_invalid_stickiness_reads_the_replica(replicated):
+    headers = login(replicated, 'user', 'User123!')
+    replicated.post('/projects', headers=headers, json={'nombre': 'Nuevo'})
+
+    assert project_names(replicated, {**headers, 'X-DB-Sticky-Until': f'{time.time() - 1:.3f}'}) == []
+    assert project_names(replicated, {**headers, 'X-DB-Sticky-Until': 'x'}) == []
+
+
+def test_reads_carry_no_sticky_header(replicated):
+    headers = login(replicated, 'user', 'User123!')
+    assert 'X-DB-Sticky-Until' not in replicated.get('/projects', headers=headers).headers
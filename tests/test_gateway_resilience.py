@@ -0,0 +1,132 @@
+import pytest
+
+from web import gateway
+from web.gateway import CircuitBreaker, RetryBudget
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(gateway.time, 'monotonic', clock)
+    return clock
+
+
+def breaker():
+    return CircuitBreaker(window=10, min_requests=4, failure_rate=0.5, open_seconds=5)
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        breaker.record(breaker.admit(), failed=True)
+
+
+def test_breaker_stays_closed_below_min_requests(clock):
+    cb = breaker()
+    fail(cb, 3)
+    assert cb.state == CircuitBreaker.CLOSED
+    assert cb.admit() == CircuitBreaker.CLOSED
+
+
+def test_breaker_stays_closed_below_failure_rate(clock):
+    cb = breaker()
+    for failed in (True, False, False, False, True, False):
+        cb.record(cb.admit(), failed=failed)
+    assert cb.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_and_rejects(clock):
+    cb = breaker()
+    fail(cb, 4)
+    assert cb.state == CircuitBreaker.OPEN
+    assert cb.admit() is None
+    assert cb.stats()['rejected'] == 1
+    assert cb.stats()['times_opened'] == 1
+
+
+def test_breaker_forgets_failures_outside_the_window(clock):
+    cb = breaker()
+    fail(cb, 3)
+    clock.advance(11)
+    cb.record(cb.admit(), failed=True)
+    assert cb.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_admits_a_single_trial(clock):
+    cb = breaker()
+    fail(cb, 4)
+    clock.advance(5)
+    assert cb.admit() == CircuitBreaker.HALF_OPEN
+    assert cb.admit() is None
+
+
+def test_half_open_trial_success_closes(clock):
+    cb = breaker()
+    fail(cb, 4)
+    clock.advance(5)
+    cb.record(cb.admit(), failed=False)
+    assert cb.state == CircuitBreaker.CLOSED
+    assert cb.stats()['window_calls'] == 0
+    assert cb.admit() == CircuitBreaker.CLOSED
+
+
+def test_half_open_trial_failure_reopens(clock):
+    cb = breaker()
+    fail(cb, 4)
+    clock.advance(5)
+    cb.record(cb.admit(), failed=True)
+    assert cb.state == CircuitBreaker.OPEN
+    assert cb.stats()['times_opened'] == 2
+    assert cb.admit() is None
+
+
+def test_half_open_trial_that_never_reports_stops_blocking(clock):
+    cb = breaker()
+    fail(cb, 4)
+    clock.advance(5)
+    assert cb.admit() == CircuitBreaker.HALF_OPEN
+    clock.advance(5)
+    assert cb.admit() == CircuitBreaker.HALF_OPEN
+
+
+def test_late_outcome_does_not_count_after_opening(clock):
+    cb = breaker()
+    admitted = cb.admit()
+    fail(cb, 4)
+    cb.record(admitted, failed=False)
+    assert cb.state == CircuitBreaker.OPEN
+
+
+def test_retry_budget_spends_down_to_zero():
+    budget = RetryBudget(ratio=0.5, capacity=2)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    assert budget.stats() == {'tokens': 0, 'retries': 2, 'exhausted': 1}
+
+
+def test_retry_budget_refills_with_traffic():
+    budget = RetryBudget(ratio=0.5, capacity=2)
+    budget.withdraw()
+    budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_retry_budget_refill_is_capped():
+    budget = RetryBudget(ratio=0.5, capacity=2)
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
@@ -0,0 +1,63 @@
+def create_conversation(api, headers, count):
+    project = api.post('/projects', headers=headers, json={'nombre': 'conversación'}).get_json()['project']
+    for index in range(count):
+        response = api.post(f'/projects/{project["id"]}/messages', headers=headers,
+                            json={'contenido': str(index), 'es_bot': index % 2 == 1})
+        assert response.status_code == 201
+    return project['id']
+
+
+def contents(data):
+    return [message['contenido'] for message in data['messages']]
+
+
+def test_latest_messages_report_older_ones(api, user):
+    project_id = create_conversation(api, user, 5)
+    data = api.get(f'/projects/{project_id}/messages', headers=user, query_string={'limit': 3}).get_json()
+    assert contents(data) == ['2', '3', '4']
+    assert data['has_more'] is True
+
+    data = api.get(f'/projects/{project_id}/messages', headers=user, query_string={'limit': 10}).get_json()
+    assert contents(data) == ['0', '1', '2', '3', '4']
+    assert data['has_more'] is False
+
+
+def test_before_pages_backwards(api, user):
+    project_id = create_conversation(api, user, 5)
+    url = f'/projects/{project_id}/messages'
+    latest = api.get(url, headers=user, query_string={'limit': 2}).get_json()
+    older = api.get(url, headers=user, query_string={'limit': 2, 'before': latest['prev_cursor']}).get_json()
+    oldest = api.get(url, headers=user, query_string={'limit': 2, 'before': older['prev_cursor']}).get_json()
+
+    assert [contents(page) for page in (oldest, older, latest)] == [['0'], ['1', '2'], ['3', '4']]
+    assert (older['has_more'], oldest['has_more']) == (True, False)
+
+
+def test_since_returns_newer_messages(api, user):
+    project_id = create_conversation(api, user, 5)
+    url = f'/projects/{project_id}/messages'
+    first = api.get(url, headers=user, query_string={'limit': 10}).get_json()['messages'][0]
+
+    data = api.get(url, headers=user, query_string={'since': first['id'], 'limit': 2}).get_json()
+    assert contents(data) == ['1', '2']
+    assert data['has_more'] is True
+
+    data = api.get(url, headers=user, query_string={'since': data['next_cursor'], 'limit': 5}).get_json()
+    assert contents(data) == ['3', '4']
+    assert data['has_more'] is False
+
+
+def test_invalid_cursors(api, user, admin):
+    project_id = create_conversation(api, user, 2)
+    other_project = create_conversation(api, admin, 1)
+    foreign_id = api.get(f'/projects/{other_project}/messages', headers=admin).get_json()['messages'][0]['id']
+    url = f'/projects/{project_id}/messages'
+
+    assert api.get(url, headers=user, query_string={'since': 1, 'before': 2}).status_code == 400
+    assert api.get(url, headers=user, query_string={'before': foreign_id}).status_code == 400
+    assert api.get(url, headers=user, query_string={'limit': 'x'}).status_code == 400
+
+
+def test_other_users_cannot_read_the_history(api, user, admin):
+    project_id = create_conversation(api, admin, 1)
+    assert api.get(f'/projects/{project_id}/messages', headers=user).status_code == 403
@@ -0,0 +1,60 @@
+
+def create_users(api, admin, count):
+    for index in range(count):
+        response = api.post('/users', headers=admin, json={
+            'username': f'usuario{index}',
+            'nombre': f'Nombre{index}',
+            'apellidos': 'Apellidos',
+            'correo': f'usuario{index}@example.com',
+            'password': 'Passw0rd!'
+        })
+        assert response.status_code == 201, response.get_json()
+
+
+def test_list_without_page_arguments_is_complete(api, admin):
+    create_users(api, admin, 3)
+    data = api.get('/users', headers=admin).get_json()
+    assert len(data['users']) == 5
+    assert data['next_cursor'] is None
+
+
+def test_cursor_walks_every_item_once(api, admin):
+    create_users(api, admin, 5)
+    all_ids = [user['id'] for user in api.get('/users', headers=admin).get_json()['users']]
+
+    seen = []
+    params = {'limit': 2}
+    while True:
+        data = api.get('/users', headers=admin, query_string=params).get_json()
+        assert len(data['users']) <= 2
+        seen.extend(user['id'] for user in data['users'])
+        if data['next_cursor'] is None:
+            break
+        params['cursor'] = data['next_cursor']
+
+    assert seen == all_ids
+
+
+def test_fields_projection(api, admin):
+    data = api.get('/users', headers=admin, query_string={'fields': 'id,nombre', 'limit': 1}).get_json()
+    assert [sorted(user) for user in data['users']] == [['id', 'nombre']]
+    assert data['next_cursor'] == data['users'][0]['id']
+
+
+def test_invalid_page_arguments(api, admin):
+    assert api.get('/users', headers=admin, query_string={'limit': 0}).status_code == 400
+    assert api.get('/users', headers=admin, query_string={'cursor': 'x'}).status_code == 400
+    assert api.get('/users', headers=admin, query_string={'fields': 'password'}).status_code == 400
+
+
+def test_project_pages_only_hold_the_callers_projects(api, admin, user):
+    for index in range(3):
+        api.post('/projects', headers=user, json={'nombre': f'mío {index}'})
+        api.post('/projects', headers=admin, json={'nombre': f'ajeno {index}'})
+
+    first = api.get('/projects', headers=user, query_string={'limit': 2}).get_json()
+    second = api.get('/projects', headers=user, query_string={'limit': 2, 'cursor': first['next_cursor']}).get_json()
+
+    names = [project['nombre'] for project in first['projects'] + second['projects']]
+    assert names == ['mío 0', 'mío 1', 'mío 2']
+    assert second['next_cursor'] is None
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from web.single_flight import AsyncSingleFlight, SingleFlight
+
+
+class UpstreamDown(Exception):
+    pass
+
+
+def run_followers(flight, key, function, count):
+    """
+    Starts count threads calling flight.do(key, function); returns them and their outcomes
+    """
+    outcomes = [None] * count
+
+    def call(index):
+        try:
+            outcomes[index] = ('result', flight.do(key, function))
+        except Exception as e:
+            outcomes[index] = ('error', e)
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def wait_for_followers(flight, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while flight.stats()['shared'] < count:
+        assert time.monotonic() < deadline, 'los seguidores no llegaron a esperar la llamada'
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def leader_call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'projects'
+
+    leader, leader_outcome = run_followers(flight, 'key', leader_call, 1)
+    started.wait(5)
+    followers, outcomes = run_followers(flight, 'key', leader_call, 5)
+    wait_for_followers(flight, 5)
+    release.set()
+    for thread in leader + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert leader_outcome == [('result', 'projects')]
+    assert outcomes == [('result', 'projects')] * 5
+    assert flight.stats() == {'in_flight': 0, 'calls': 1, 'shared': 5}
+
+
+def test_leader_failure_reaches_every_follower():
+    flight = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+    error = UpstreamDown('api caída')
+
+    def failing_call():
+        started.set()
+        release.wait(5)
+        raise error
+
+    leader, leader_outcome = run_followers(flight, 'key', failing_call, 1)
+    started.wait(5)
+    followers, outcomes = run_followers(flight, 'key', failing_call, 3)
+    wait_for_followers(flight, 3)
+    release.set()
+    for thread in leader + followers:
+        thread.join(5)
+
+    assert leader_outcome == [('error', error)]
+    assert outcomes == [('error', error)] * 3
+
+
+def test_failed_call_is_not_remembered():
+    flight = SingleFlight()
+
+    def failing_call():
+        raise UpstreamDown()
+
+    with pytest.raises(UpstreamDown):
+        flight.do('key', failing_call)
+    assert flight.do('key', lambda: 'retried') == 'retried'
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_async_leader_failure_reaches_every_follower():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def failing_call():
+            calls.append(1)
+            await release.wait()
+            raise UpstreamDown('api caída')
+
+        callers = [asyncio.ensure_future(flight.do('key', failing_call)) for _ in range(4)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*callers, return_exceptions=True)
+        return flight, calls, outcomes
+
+    flight, calls, outcomes = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(outcome, UpstreamDown) for outcome in outcomes)
+    assert flight.stats() == {'in_flight': 0, 'calls': 1, 'shared': 3}
+
+
+def test_async_cancelled_caller_does_not_cancel_the_call():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def slow_call():
+            await release.wait()
+            return 'projects'
+
+        first = asyncio.ensure_future(flight.do('key', slow_call))
+        second = asyncio.ensure_future(flight.do('key', slow_call))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ('projects', True)
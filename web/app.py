@@ -1,13 +1,16 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session
+from flask import Flask, Response, render_template, redirect, url_for, request, flash, session
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 import requests
 from datetime import timedelta
 from web.models.user import User
+from web import gateway
+from web import auth
+from web.auth import user_cache, invalidate_user
+from web.sessions import ServerSideSessionInterface, create_session_store
+from web.cache import StaleWhileRevalidateCache
+from services import instrumentation
 import os
-
-# URLs for microservices
-API_URL = 'http://localhost:5001'  # Projects and users API
-CHAT_URL = 'http://localhost:5002'  # Chat microservice
+import time
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 
@@ -18,6 +21,51 @@ app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
+# Server-side sessions (SESSION_BACKEND): the cookie only carries an opaque id
+session_store = create_session_store()
+if session_store is not None:
+    app.session_interface = ServerSideSessionInterface(session_store)
+auth.share_stale_markers(session_store)
+
+# Request ids, spans and /metrics
+instrumentation.init_app(app, 'web')
+
+# Project lists of the chat page, per user: fresh for PROJECT_CACHE_TTL seconds,
+# then served while they are refreshed in the background, up to PROJECT_CACHE_MAX_STALE
+project_cache = StaleWhileRevalidateCache(
+    maxsize=int(os.environ.get('PROJECT_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('PROJECT_CACHE_TTL', 30)),
+    max_stale=float(os.environ.get('PROJECT_CACHE_MAX_STALE', 600))
+)
+# When the user last changed their projects. Kept in the session so that
+# every worker, not just the one that made the change, skips older lists.
+PROJECTS_CHANGED_KEY = 'projects_changed_at'
+
+def project_list_loader(token, cursor=None):
+    """
+    Loader of one page of the caller's project list, used for project_cache;
+    it runs without a request context, so the token is passed in
+    """
+    def load():
+        response, projects, next_cursor = gateway.get_page(
+            gateway.api, '/projects', 'projects', cursor=cursor,
+            params={'fields': 'id,nombre'},
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        response.raise_for_status()
+        return {'projects': projects, 'next_cursor': next_cursor}
+    return load
+
+def projects_changed(project_id=None):
+    """
+    Drops the cached project lists a write has made outdated
+    """
+    session[PROJECTS_CHANGED_KEY] = time.time()
+    project_cache.invalidate(str(current_user.id))
+    if project_id is not None:
+        # Other users' lists (e.g. an admin's) that include the project
+        project_cache.invalidate_where(lambda key, page: any(p['id'] == project_id for p in page['projects']))
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -33,17 +81,45 @@ def load_user(user_id):
         if not token:
             return None
 
+        # Profile kept in a server-side session
+        user = auth.user_from_profile(session, user_id)
+        if user is not None:
+            return user
+
+        # Trust the token's own claims when they are verified locally and still fresh
+        if auth.LOCAL_JWT_VERIFICATION:
+            try:
+                user = auth.user_from_token(token, user_id)
+            except auth.InvalidToken:
+                return None
+            if user is not None:
+                return user
+
+        cache_key = auth.user_cache_key(user_id, token)
+        user = user_cache.get(cache_key)
+        if user is not None:
+            return user
+
         # Get user from API with JWT token
         headers = {'Authorization': f'Bearer {token}'}
-        response = requests.get(f'{API_URL}/users/{user_id}', headers=headers)
+        response = gateway.api.get(f'/users/{user_id}', headers=headers)
 
         if response.status_code == 200:
             user_data = response.json()['user']
-            return User.from_api_data(user_data)
+            user = User.from_api_data(user_data)
+            user_cache.set(cache_key, user)
+            auth.store_profile(session, user_data)
+            return user
     except requests.RequestException:
         pass
     return None
 
+@app.before_request
+def relay_db_sticky():
+    until = request.headers.get(gateway.DB_STICKY_HEADER)
+    if until:
+        gateway.relay_sticky(session, until)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -59,7 +135,7 @@ def login():
 
         try:
             # Login using the API's authentication endpoint
-            response = requests.post(f'{API_URL}/auth/login', json={
+            response = gateway.api.post('/auth/login', json={
                 'username': username,
                 'password': password
             })
@@ -72,11 +148,19 @@ def login():
                 user = User.from_api_data(user_data)
 
                 # Store the JWT token in the session
+                if getattr(session, 'server_side', False):
+                    session.regenerate()
                 session['access_token'] = access_token
+                auth.store_profile(session, user_data)
+                user_cache.set(auth.user_cache_key(user.id, access_token), user)
 
                 login_user(user)
+                # Likely the next page, so the chat page finds the list already loaded
+                project_cache.prefetch(str(user.id), project_list_loader(access_token))
                 next_page = request.args.get('next')
                 return redirect(next_page or url_for('index'))
+            elif response.status_code == 503:
+                flash('El servicio está ocupado, inténtalo de nuevo en unos segundos', 'warning')
             else:
                 flash('Nombre de usuario o contraseña incorrectos', 'danger')
         except requests.RequestException as e:
@@ -87,7 +171,9 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
-    session.pop('access_token', None)
+    token = session.pop('access_token', None)
+    session.pop(auth.SESSION_PROFILE_KEY, None)
+    user_cache.delete(auth.user_cache_key(current_user.id, token))
     logout_user()
     return redirect(url_for('login'))
 
@@ -99,10 +185,15 @@ def usuarios():
         token = session.get('access_token')
         headers = {'Authorization': f'Bearer {token}'}
 
-        response = requests.get(f'{API_URL}/users', headers=headers)
+        # One page, with only the fields rendered by the template
+        cursor = request.args.get('cursor', type=int)
+        response, users, next_cursor = gateway.get_page(
+            gateway.api, '/users', 'users', cursor=cursor,
+            params={'fields': 'id,nombre,apellidos'},
+            headers=headers
+        )
         if response.status_code == 200:
-            users = response.json().get('users', [])
-            return render_template('usuarios.html', users=users)
+            return render_template('usuarios.html', users=users, cursor=cursor, next_cursor=next_cursor)
         elif response.status_code == 403:
             flash('No tienes permisos para ver la lista de usuarios', 'danger')
             return redirect(url_for('index'))
@@ -141,8 +232,8 @@ def usuario_nuevo():
                 'is_admin': False  # By default, new users are not admins
             }
 
-            response = requests.post(
-                f'{API_URL}/users',
+            response = gateway.api.post(
+                '/users',
                 json=user_data,
                 headers=headers
             )
@@ -160,17 +251,17 @@ def usuario_nuevo():
 @login_required
 def chat():
     try:
-        # Get JWT token from session
-        token = session.get('access_token')
-        headers = {'Authorization': f'Bearer {token}'}
-
-        response = requests.get(f'{API_URL}/projects', headers=headers)
-        if response.status_code == 200:
-            projects = response.json().get('projects', [])
-            return render_template('chat.html', proyectos=projects)
+        cursor = request.args.get('cursor', type=int)
+        loader = project_list_loader(session.get('access_token'), cursor)
+        if cursor is None:
+            # Cached first page, possibly a little stale, while it is refreshed in the background
+            page = project_cache.get(str(current_user.id), loader, not_before=session.get(PROJECTS_CHANGED_KEY))
         else:
-            flash('Error al obtener proyectos', 'danger')
-            return redirect(url_for('index'))
+            page = loader()
+        return render_template('chat.html', proyectos=page['projects'], cursor=cursor, next_cursor=page['next_cursor'])
+    except requests.HTTPError:
+        flash('Error al obtener proyectos', 'danger')
+        return redirect(url_for('index'))
     except requests.RequestException as e:
         flash(f'Error al conectar con el servicio: {str(e)}', 'danger')
         return redirect(url_for('index'))
@@ -197,13 +288,14 @@ def proyecto_nuevo():
                 'usuario_id': current_user.id
             }
 
-            response = requests.post(
-                f'{API_URL}/projects',
+            response = gateway.api.post(
+                '/projects',
                 json=project_data,
                 headers=headers
             )
 
             if response.status_code == 201:
+                projects_changed()
                 flash('Proyecto creado exitosamente', 'success')
             else:
                 flash(f'Error al crear proyecto: {response.json().get("message", "Error desconocido")}', 'danger')
@@ -218,7 +310,7 @@ def send_message():
     text = request.json.get('message', '')
 
     try:
-        response = requests.post(f'{CHAT_URL}/api/chat', json={'message': text})
+        response = gateway.chat.post('/api/chat', json={'message': text})
         if response.status_code == 200:
             return response.json()
         else:
@@ -226,6 +318,105 @@ def send_message():
     except requests.RequestException:
         return {'message': 'Error de conexión al servicio de chat'}, 500
 
+def relay_chat_stream(text, project_id=None, on_done=None):
+    """
+    Opens a streaming request to the chat service and relays its events
+    chunk by chunk, without buffering the reply.
+    on_done(reply) runs once the full reply is known and may return extra
+    events to send before the stream is closed.
+    """
+    try:
+        upstream = gateway.chat.post(
+            '/api/chat/stream',
+            json={'message': text, 'proyecto_id': project_id},
+            stream=True
+        )
+    except requests.RequestException:
+        return {'message': 'Error de conexión al servicio de chat'}, 500
+
+    if upstream.status_code != 200:
+        upstream.close()
+        return {'message': 'Error al enviar mensaje al servicio de chat'}, 500
+
+    def events():
+        parser = gateway.SSEParser()
+        reply = None
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+                for event, data in parser.feed(chunk):
+                    if event == 'done':
+                        reply = data.get('message')
+        except requests.RequestException:
+            yield gateway.sse_event('error', {'error': 'Error de conexión al servicio de chat'})
+        finally:
+            upstream.close()
+
+        if reply is not None and on_done:
+            yield from on_done(reply)
+
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/send-message/stream', methods=['POST'])
+@login_required
+def send_message_stream():
+    text = request.json.get('message', '')
+    return relay_chat_stream(text)
+
+@app.route('/api/proyecto/<int:project_id>/turno/stream', methods=['POST'])
+@login_required
+def turno_conversacion_stream(project_id):
+    """
+    Streaming variant of a chat turn: the user message is stored first, so
+    it is kept even if the reply fails, and the reply is relayed as it is
+    generated and stored once it is complete
+    """
+    data = request.get_json() or {}
+    text = data.get('message', '').strip()
+    if not text:
+        return {'error': 'El mensaje no puede estar vacío'}, 400
+
+    token = session.get('access_token')
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+
+    try:
+        response = gateway.api.post(
+            f'/projects/{project_id}/messages',
+            json={'messages': [{'contenido': text, 'es_bot': False}]},
+            headers=headers
+        )
+        if response.status_code != 201:
+            return response.json(), response.status_code
+        stored = response.json()['messages']
+    except requests.RequestException as e:
+        return {'error': f'Error al guardar mensaje: {str(e)}'}, 500
+
+    # The stream outlives the request context, so the headers were read above
+    def store_turn(reply):
+        try:
+            response = gateway.api.post(
+                f'/projects/{project_id}/messages',
+                json={'messages': [{'contenido': reply, 'es_bot': True}]},
+                headers=headers
+            )
+            if response.status_code == 201:
+                # This write comes after the response left the request, so its
+                # stickiness goes to the browser, which sends it back (see relay_sticky)
+                yield gateway.sse_event('stored', {
+                    'mensajes': stored + response.json()['messages'],
+                    'sticky_until': gateway.sticky_until(response)
+                })
+            else:
+                yield gateway.sse_event('error', {'error': response.json().get('message', 'Error al guardar mensaje')})
+        except requests.RequestException as e:
+            yield gateway.sse_event('error', {'error': f'Error al guardar mensaje: {str(e)}'})
+
+    return relay_chat_stream(text, project_id, on_done=store_turn)
+
 @app.route('/api/proyecto/editar/<int:project_id>', methods=['PUT'])
 @login_required
 def editar_proyecto(project_id):
@@ -244,14 +435,16 @@ def editar_proyecto(project_id):
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
 
         # Send request to API service
-        response = requests.put(
-            f'{API_URL}/projects/{project_id}',
+        response = gateway.api.put(
+            f'/projects/{project_id}',
             json={
                 'nombre': nombre,
                 'descripcion': descripcion
             },
             headers=headers
         )
+        if response.status_code == 200:
+            projects_changed(project_id)
 
         # Return API response
         return response.json(), response.status_code
@@ -267,13 +460,14 @@ def eliminar_proyecto(project_id):
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
 
         # Send request to API service
-        response = requests.delete(
-            f'{API_URL}/projects/{project_id}',
+        response = gateway.api.delete(
+            f'/projects/{project_id}',
             headers=headers
         )
 
         # Return API response
         if response.status_code == 200:
+            projects_changed(project_id)
             return {'success': 'Proyecto eliminado correctamente'}, 200
         else:
             return response.json(), response.status_code
@@ -289,8 +483,8 @@ def obtener_proyecto(project_id):
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
 
         # Send request to API service
-        response = requests.get(
-            f'{API_URL}/projects/{project_id}',
+        response = gateway.api.get(
+            f'/projects/{project_id}',
             headers=headers
         )
 
@@ -306,11 +500,22 @@ def obtener_proyecto(project_id):
 @login_required
 def obtener_mensajes_proyecto(project_id):
     try:
-        # You would typically call your API microservice here to get messages
-        # For now, we'll return an empty list since the message functionality
-        # might be implemented differently or stored in a separate database
-        return []
-    except Exception as e:
+        # Get JWT token from session and prepare headers
+        token = session.get('access_token')
+        headers = {'Authorization': f'Bearer {token}'}
+
+        # Forward the pagination cursors (?since=, ?before=) and page size
+        params = {key: request.args[key] for key in ('since', 'before', 'limit') if key in request.args}
+
+        response = gateway.api.get(
+            f'/projects/{project_id}/messages',
+            params=params,
+            headers=headers
+        )
+
+        # Return API response (messages already in chronological order)
+        return response.json(), response.status_code
+    except requests.RequestException as e:
         return {'error': f'Error al obtener mensajes: {str(e)}'}, 500
 
 @app.route('/api/mensaje', methods=['POST'])
@@ -323,12 +528,75 @@ def guardar_mensaje():
         es_bot = data.get('es_bot', False)
         proyecto_id = data.get('proyecto_id')
 
-        # Here you would typically call your API microservice to save the message
-        # Since this is a simple implementation, we'll just return success
-        return {'success': True, 'message': 'Mensaje guardado correctamente'}, 200
-    except Exception as e:
+        if not contenido or not proyecto_id:
+            return {'error': 'Contenido y proyecto son obligatorios'}, 400
+
+        # Get JWT token from session and prepare headers
+        token = session.get('access_token')
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+
+        response = gateway.api.post(
+            f'/projects/{proyecto_id}/messages',
+            json={
+                'contenido': contenido,
+                'es_bot': es_bot
+            },
+            headers=headers
+        )
+
+        if response.status_code == 201:
+            return {'success': True, 'message': 'Mensaje guardado correctamente',
+                    'mensaje': response.json()['messages'][0]}, 200
+        else:
+            return response.json(), response.status_code
+    except requests.RequestException as e:
+        return {'error': f'Error al guardar mensaje: {str(e)}'}, 500
+
+@app.route('/api/proyecto/<int:project_id>/turno', methods=['POST'])
+@login_required
+def turno_conversacion(project_id):
+    """
+    One chat turn in a single round trip: asks the chat service for a reply
+    and stores the user message and the reply together
+    """
+    data = request.get_json() or {}
+    text = data.get('message', '').strip()
+    if not text:
+        return {'error': 'El mensaje no puede estar vacío'}, 400
+
+    mensajes = [{'contenido': text, 'es_bot': False}]
+    bot_error = None
+    try:
+        response = gateway.chat.post('/api/chat', json={'message': text, 'proyecto_id': project_id})
+        if response.status_code == 200:
+            mensajes.append({'contenido': response.json()['message'], 'es_bot': True})
+        else:
+            bot_error = 'Error al enviar mensaje al servicio de chat'
+    except requests.RequestException:
+        bot_error = 'Error de conexión al servicio de chat'
+
+    try:
+        # Get JWT token from session and prepare headers
+        token = session.get('access_token')
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+
+        # Both messages are stored in one request and one transaction
+        response = gateway.api.post(
+            f'/projects/{project_id}/messages',
+            json={'messages': mensajes},
+            headers=headers
+        )
+        if response.status_code != 201:
+            return response.json(), response.status_code
+        stored = response.json()['messages']
+    except requests.RequestException as e:
         return {'error': f'Error al guardar mensaje: {str(e)}'}, 500
 
+    if bot_error:
+        return {'error': bot_error, 'mensajes': stored}, 502
+
+    return {'message': stored[-1]['contenido'], 'mensajes': stored}, 200
+
 @app.route('/api/usuario/editar/<int:user_id>', methods=['PUT'])
 @login_required
 def editar_usuario(user_id):
@@ -360,12 +628,15 @@ def editar_usuario(user_id):
             user_data['password'] = data['contrasena']
 
         # Send request to API
-        response = requests.put(
-            f'{API_URL}/users/{user_id}',
+        response = gateway.api.put(
+            f'/users/{user_id}',
             json=user_data,
             headers=headers
         )
 
+        if response.status_code == 200:
+            invalidate_user(user_id)
+
         # Return API response
         return response.json(), response.status_code
     except requests.RequestException as e:
@@ -380,13 +651,14 @@ def eliminar_usuario(user_id):
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
 
         # Send request to API
-        response = requests.delete(
-            f'{API_URL}/users/{user_id}',
+        response = gateway.api.delete(
+            f'/users/{user_id}',
             headers=headers
         )
 
         # Return API response
         if response.status_code == 200:
+            invalidate_user(user_id)
             return {'success': 'Usuario eliminado correctamente'}, 200
         else:
             return response.json(), response.status_code
@@ -402,8 +674,8 @@ def obtener_usuario(user_id):
         headers = {'Authorization': f'Bearer {token}'}
 
         # Send request to API
-        response = requests.get(
-            f'{API_URL}/users/{user_id}',
+        response = gateway.api.get(
+            f'/users/{user_id}',
             headers=headers
         )
 
@@ -424,5 +696,18 @@ def obtener_usuario(user_id):
     except requests.RequestException as e:
         return {'error': f'Error al conectar con el servicio: {str(e)}'}, 500
 
+@app.route('/api/gateway/stats', methods=['GET'])
+@login_required
+def gateway_stats():
+    # Per-upstream connection pool counters and identity cache metrics, for admins only
+    if not current_user.is_admin:
+        return {'error': 'Acceso denegado'}, 403
+    return {
+        'upstreams': gateway.stats(),
+        'user_cache': user_cache.stats(),
+        'project_cache': project_cache.stats(),
+        'sessions': session_store.stats() if session_store is not None else None
+    }, 200
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
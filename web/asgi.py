@@ -0,0 +1,663 @@
+"""
+Async (ASGI) variant of the web gateway.
+
+Serves the same routes and templates as web/app.py, but handlers are
+coroutines and upstream calls go through httpx (web/async_gateway.py), so a
+worker keeps serving other requests while it waits on the API or the chat
+service. Pages that need several upstream calls issue them concurrently.
+
+Run it with an ASGI server, e.g.: hypercorn web.asgi:app --bind 0.0.0.0:5000
+"""
+import asyncio
+import functools
+import os
+import time
+from datetime import timedelta
+
+import httpx
+from quart import Quart, Response, render_template, redirect, url_for, request, flash, session, g
+from quart.sessions import SessionInterface
+
+from web import async_gateway as gateway
+from web import auth
+from web.auth import user_cache, invalidate_user
+from web.cache import StaleWhileRevalidateCache
+from web.gateway import DB_STICKY_HEADER, SSEParser, relay_sticky, sse_event, sticky_until
+from web.models.user import User
+from web.sessions import ServerSideSessionMixin, create_session_store
+from services import instrumentation
+
+app = Quart(__name__, template_folder='../templates', static_folder='../static')
+
+# Configuración (same as web/app.py)
+app.config['SECRET_KEY'] = 'your-secret-key'
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)  # Session expires after 1 hour
+app.config['SESSION_COOKIE_SECURE'] = True
+app.config['SESSION_COOKIE_HTTPONLY'] = True
+app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+
+
+class AsyncServerSideSessionInterface(ServerSideSessionMixin, SessionInterface):
+    """
+    Quart flavour of web.sessions.ServerSideSessionInterface
+    """
+
+    async def open_session(self, app, request):
+        return self._open(app, request.cookies)
+
+    async def save_session(self, app, session, response):
+        self._save(app, session, response)
+
+
+session_store = create_session_store()
+if session_store is not None:
+    app.session_interface = AsyncServerSideSessionInterface(session_store)
+auth.share_stale_markers(session_store)
+
+# Request ids, spans and /metrics
+instrumentation.init_async_app(app, 'web')
+
+# Project lists of the chat page (same settings and session marker as web/app.py)
+project_cache = StaleWhileRevalidateCache(
+    maxsize=int(os.environ.get('PROJECT_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('PROJECT_CACHE_TTL', 30)),
+    max_stale=float(os.environ.get('PROJECT_CACHE_MAX_STALE', 600))
+)
+PROJECTS_CHANGED_KEY = 'projects_changed_at'
+
+LOGIN_MESSAGE = 'Por favor inicie sesión para acceder a esta página.'
+
+@app.after_serving
+async def close_pools():
+    await gateway.close()
+
+def auth_headers(json=False):
+    headers = {'Authorization': f'Bearer {session.get("access_token")}'}
+    if json:
+        headers['Content-Type'] = 'application/json'
+    return headers
+
+def project_list_loader(token, cursor=None):
+    """
+    Coroutine loader of one page of the caller's project list, used for project_cache
+    """
+    async def load():
+        response, projects, next_cursor = await gateway.get_page(
+            gateway.api, '/projects', 'projects', cursor=cursor,
+            params={'fields': 'id,nombre'},
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        response.raise_for_status()
+        return {'projects': projects, 'next_cursor': next_cursor}
+    return load
+
+def projects_changed(project_id=None):
+    """
+    Drops the cached project lists a write has made outdated
+    """
+    session[PROJECTS_CHANGED_KEY] = time.time()
+    project_cache.invalidate(str(g.current_user.id))
+    if project_id is not None:
+        # Other users' lists (e.g. an admin's) that include the project
+        project_cache.invalidate_where(lambda key, page: any(p['id'] == project_id for p in page['projects']))
+
+async def load_user(user_id, token):
+    """
+    Same lookup order as web/app.py: session profile, verified token claims, user cache, API
+    """
+    if not token:
+        return None
+
+    user = auth.user_from_profile(session, user_id)
+    if user is not None:
+        return user
+
+    if auth.LOCAL_JWT_VERIFICATION:
+        try:
+            user = auth.user_from_token(token, user_id)
+        except auth.InvalidToken:
+            return None
+        if user is not None:
+            return user
+
+    cache_key = auth.user_cache_key(user_id, token)
+    user = user_cache.get(cache_key)
+    if user is not None:
+        return user
+
+    try:
+        response = await gateway.api.get(f'/users/{user_id}', headers={'Authorization': f'Bearer {token}'})
+    except httpx.HTTPError:
+        return None
+
+    if response.status_code == 200:
+        user_data = response.json()['user']
+        user = User.from_api_data(user_data)
+        user_cache.set(cache_key, user)
+        auth.store_profile(session, user_data)
+        return user
+    return None
+
+async def redirect_to_login():
+    session.clear()
+    await flash(LOGIN_MESSAGE, 'message')
+    return redirect(url_for('login', next=request.path))
+
+def read_only(view):
+    """
+    Marks a view that login_required may run concurrently with the identity
+    lookup. Only for GET views without side effects: their result is thrown
+    away if the user turns out not to be logged in, and they see
+    g.current_user as None.
+    """
+    view.read_only = True
+    return view
+
+def login_required(view):
+    """
+    Resolves the current user into g.current_user.
+
+    For GET requests to @read_only views the identity lookup runs
+    concurrently with the view's own upstream calls and the response is
+    only released once the user is known. Any other view waits for the
+    identity before touching anything.
+    """
+    concurrent = getattr(view, 'read_only', False)
+
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        user_id = session.get('_user_id')
+        if not user_id:
+            return await redirect_to_login()
+
+        identity = asyncio.ensure_future(load_user(user_id, session.get('access_token')))
+
+        if not concurrent or request.method != 'GET':
+            g.current_user = await identity
+            if g.current_user is None:
+                return await redirect_to_login()
+            return await view(*args, **kwargs)
+
+        g.current_user = None
+        response = asyncio.ensure_future(view(*args, **kwargs))
+        user = await identity
+        if user is None:
+            response.cancel()
+            return await redirect_to_login()
+        g.current_user = user
+        return await response
+
+    return wrapper
+
+@app.before_request
+async def relay_db_sticky():
+    until = request.headers.get(DB_STICKY_HEADER)
+    if until:
+        relay_sticky(session, until)
+
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+@app.route('/login', methods=['GET', 'POST'])
+async def login():
+    if session.get('_user_id'):
+        return redirect(url_for('index'))
+
+    if request.method == 'POST':
+        form = await request.form
+        username = form.get('username')
+        password = form.get('password')
+
+        try:
+            # Login using the API's authentication endpoint
+            response = await gateway.api.post('/auth/login', json={
+                'username': username,
+                'password': password
+            })
+
+            if response.status_code == 200:
+                data = response.json()
+                access_token = data.get('access_token')
+                user = User.from_api_data(data.get('user'))
+
+                # Store the JWT token in the session
+                if getattr(session, 'server_side', False):
+                    session.regenerate()
+                session['access_token'] = access_token
+                session['_user_id'] = str(user.id)
+                auth.store_profile(session, data.get('user'))
+                user_cache.set(auth.user_cache_key(user.id, access_token), user)
+
+                # Likely the next page, so the chat page finds the list already loaded
+                project_cache.aprefetch(str(user.id), project_list_loader(access_token))
+                next_page = request.args.get('next')
+                return redirect(next_page or url_for('index'))
+            elif response.status_code == 503:
+                await flash('El servicio está ocupado, inténtalo de nuevo en unos segundos', 'warning')
+            else:
+                await flash('Nombre de usuario o contraseña incorrectos', 'danger')
+        except httpx.HTTPError as e:
+            await flash(f'Error al conectar con el servicio: {str(e)}', 'danger')
+
+    return await render_template('login.html')
+
+@app.route('/logout')
+@login_required
+async def logout():
+    token = session.pop('access_token', None)
+    user_cache.delete(auth.user_cache_key(session.get('_user_id'), token))
+    session.clear()
+    return redirect(url_for('login'))
+
+@app.route('/usuarios')
+@login_required
+@read_only
+async def usuarios():
+    try:
+        # One page, with only the fields rendered by the template
+        cursor = request.args.get('cursor', type=int)
+        response, users, next_cursor = await gateway.get_page(
+            gateway.api, '/users', 'users', cursor=cursor,
+            params={'fields': 'id,nombre,apellidos'},
+            headers=auth_headers()
+        )
+        if response.status_code == 200:
+            return await render_template('usuarios.html', users=users, cursor=cursor, next_cursor=next_cursor)
+        elif response.status_code == 403:
+            await flash('No tienes permisos para ver la lista de usuarios', 'danger')
+            return redirect(url_for('index'))
+        else:
+            await flash('Error al obtener usuarios', 'danger')
+            return redirect(url_for('index'))
+    except httpx.HTTPError as e:
+        await flash(f'Error al conectar con el servicio: {str(e)}', 'danger')
+        return redirect(url_for('index'))
+
+@app.route('/usuario/nuevo', methods=['POST'])
+@login_required
+async def usuario_nuevo():
+    form = await request.form
+    username = form.get('user')
+    nombre = form.get('nombre')
+    apellidos = form.get('apellidos')
+    correo = form.get('correo')
+    password = form.get('contrasena')
+
+    if not all([username, nombre, apellidos, correo, password]):
+        await flash('Por favor complete todos los campos', 'danger')
+        return redirect(url_for('usuarios'))
+
+    try:
+        response = await gateway.api.post('/users', json={
+            'username': username,
+            'nombre': nombre,
+            'apellidos': apellidos,
+            'correo': correo,
+            'password': password,
+            'is_admin': False  # By default, new users are not admins
+        }, headers=auth_headers(json=True))
+
+        if response.status_code == 201:
+            await flash('Usuario creado exitosamente', 'success')
+        else:
+            await flash(f'Error al crear usuario: {response.json().get("message", "Error desconocido")}', 'danger')
+    except httpx.HTTPError as e:
+        await flash(f'Error al conectar con el servicio: {str(e)}', 'danger')
+
+    return redirect(url_for('usuarios'))
+
+@app.route('/chat')
+@login_required
+@read_only
+async def chat():
+    try:
+        # Runs concurrently with the identity lookup started by login_required,
+        # so the cache key comes from the session rather than g.current_user
+        cursor = request.args.get('cursor', type=int)
+        loader = project_list_loader(session.get('access_token'), cursor)
+        if cursor is None:
+            page = await project_cache.aget(session['_user_id'], loader, not_before=session.get(PROJECTS_CHANGED_KEY))
+        else:
+            page = await loader()
+        return await render_template('chat.html', proyectos=page['projects'], cursor=cursor,
+                                     next_cursor=page['next_cursor'])
+    except httpx.HTTPStatusError:
+        await flash('Error al obtener proyectos', 'danger')
+        return redirect(url_for('index'))
+    except httpx.HTTPError as e:
+        await flash(f'Error al conectar con el servicio: {str(e)}', 'danger')
+        return redirect(url_for('index'))
+
+@app.route('/proyecto/nuevo', methods=['POST'])
+@login_required
+async def proyecto_nuevo():
+    form = await request.form
+    nombre = form.get('project_name')
+    descripcion = form.get('project_description')
+
+    if not nombre or not descripcion:
+        await flash('Por favor complete todos los campos', 'danger')
+        return redirect(url_for('chat'))
+
+    try:
+        response = await gateway.api.post('/projects', json={
+            'nombre': nombre,
+            'descripcion': descripcion,
+            'usuario_id': g.current_user.id
+        }, headers=auth_headers(json=True))
+
+        if response.status_code == 201:
+            projects_changed()
+            await flash('Proyecto creado exitosamente', 'success')
+        else:
+            await flash(f'Error al crear proyecto: {response.json().get("message", "Error desconocido")}', 'danger')
+    except httpx.HTTPError as e:
+        await flash(f'Error al conectar con el servicio: {str(e)}', 'danger')
+
+    return redirect(url_for('chat'))
+
+@app.route('/send-message', methods=['POST'])
+@login_required
+async def send_message():
+    data = await request.get_json()
+    text = data.get('message', '')
+
+    try:
+        response = await gateway.chat.post('/api/chat', json={'message': text})
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {'message': 'Error al enviar mensaje al servicio de chat'}, 500
+    except httpx.HTTPError:
+        return {'message': 'Error de conexión al servicio de chat'}, 500
+
+@app.route('/api/proyecto/<int:project_id>/turno', methods=['POST'])
+@login_required
+async def turno_conversacion(project_id):
+    data = await request.get_json() or {}
+    text = data.get('message', '').strip()
+    if not text:
+        return {'error': 'El mensaje no puede estar vacío'}, 400
+
+    mensajes = [{'contenido': text, 'es_bot': False}]
+    bot_error = None
+    try:
+        response = await gateway.chat.post('/api/chat', json={'message': text, 'proyecto_id': project_id})
+        if response.status_code == 200:
+            mensajes.append({'contenido': response.json()['message'], 'es_bot': True})
+        else:
+            bot_error = 'Error al enviar mensaje al servicio de chat'
+    except httpx.HTTPError:
+        bot_error = 'Error de conexión al servicio de chat'
+
+    try:
+        # Both messages are stored in one request and one transaction
+        response = await gateway.api.post(
+            f'/projects/{project_id}/messages',
+            json={'messages': mensajes},
+            headers=auth_headers(json=True)
+        )
+        if response.status_code != 201:
+            return response.json(), response.status_code
+        stored = response.json()['messages']
+    except httpx.HTTPError as e:
+        return {'error': f'Error al guardar mensaje: {str(e)}'}, 500
+
+    if bot_error:
+        return {'error': bot_error, 'mensajes': stored}, 502
+
+    return {'message': stored[-1]['contenido'], 'mensajes': stored}, 200
+
+def relay_chat_stream(text, project_id=None, on_done=None):
+    """
+    Relays the chat service's event stream chunk by chunk (see web/app.py)
+    """
+    async def events():
+        parser = SSEParser()
+        reply = None
+        try:
+            async with gateway.chat.stream(
+                'POST', '/api/chat/stream',
+                json={'message': text, 'proyecto_id': project_id}
+            ) as upstream:
+                if upstream.status_code != 200:
+                    yield sse_event('error', {'error': 'Error al enviar mensaje al servicio de chat'})
+                    return
+                async for chunk in upstream.aiter_raw():
+                    yield chunk
+                    for event, data in parser.feed(chunk):
+                        if event == 'done':
+                            reply = data.get('message')
+        except httpx.HTTPError:
+            yield sse_event('error', {'error': 'Error de conexión al servicio de chat'})
+            return
+
+        if reply is not None and on_done:
+            async for event in on_done(reply):
+                yield event
+
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/send-message/stream', methods=['POST'])
+@login_required
+async def send_message_stream():
+    data = await request.get_json()
+    return relay_chat_stream(data.get('message', ''))
+
+@app.route('/api/proyecto/<int:project_id>/turno/stream', methods=['POST'])
+@login_required
+async def turno_conversacion_stream(project_id):
+    data = await request.get_json() or {}
+    text = data.get('message', '').strip()
+    if not text:
+        return {'error': 'El mensaje no puede estar vacío'}, 400
+
+    headers = auth_headers(json=True)
+
+    # Stored before streaming, so it is kept even if the reply fails (see web/app.py)
+    try:
+        response = await gateway.api.post(
+            f'/projects/{project_id}/messages',
+            json={'messages': [{'contenido': text, 'es_bot': False}]},
+            headers=headers
+        )
+        if response.status_code != 201:
+            return response.json(), response.status_code
+        stored = response.json()['messages']
+    except httpx.HTTPError as e:
+        return {'error': f'Error al guardar mensaje: {str(e)}'}, 500
+
+    # The stream outlives the request context, so the headers were read above
+    async def store_turn(reply):
+        try:
+            response = await gateway.api.post(
+                f'/projects/{project_id}/messages',
+                json={'messages': [{'contenido': reply, 'es_bot': True}]},
+                headers=headers
+            )
+            if response.status_code == 201:
+                # Its stickiness goes back through the browser (see gateway.relay_sticky)
+                yield sse_event('stored', {
+                    'mensajes': stored + response.json()['messages'],
+                    'sticky_until': sticky_until(response)
+                })
+            else:
+                yield sse_event('error', {'error': response.json().get('message', 'Error al guardar mensaje')})
+        except httpx.HTTPError as e:
+            yield sse_event('error', {'error': f'Error al guardar mensaje: {str(e)}'})
+
+    return relay_chat_stream(text, project_id, on_done=store_turn)
+
+@app.route('/api/proyecto/editar/<int:project_id>', methods=['PUT'])
+@login_required
+async def editar_proyecto(project_id):
+    data = await request.get_json()
+    nombre = data.get('nombre')
+    descripcion = data.get('descripcion')
+
+    # Validate data
+    if not nombre or not descripcion:
+        return {'error': 'Nombre y descripción son obligatorios'}, 400
+
+    try:
+        response = await gateway.api.put(
+            f'/projects/{project_id}',
+            json={'nombre': nombre, 'descripcion': descripcion},
+            headers=auth_headers(json=True)
+        )
+        if response.status_code == 200:
+            projects_changed(project_id)
+        return response.json(), response.status_code
+    except httpx.HTTPError as e:
+        return {'error': f'Error al conectar con el servicio: {str(e)}'}, 500
+
+@app.route('/api/proyecto/eliminar/<int:project_id>', methods=['DELETE'])
+@login_required
+async def eliminar_proyecto(project_id):
+    try:
+        response = await gateway.api.delete(f'/projects/{project_id}', headers=auth_headers(json=True))
+        if response.status_code == 200:
+            projects_changed(project_id)
+            return {'success': 'Proyecto eliminado correctamente'}, 200
+        else:
+            return response.json(), response.status_code
+    except httpx.HTTPError as e:
+        return {'error': f'Error al conectar con el servicio: {str(e)}'}, 500
+
+@app.route('/api/proyecto/<int:project_id>', methods=['GET'])
+@login_required
+@read_only
+async def obtener_proyecto(project_id):
+    try:
+        response = await gateway.api.get(f'/projects/{project_id}', headers=auth_headers(json=True))
+        if response.status_code == 200:
+            return response.json().get('project', {}), 200
+        else:
+            return response.json(), response.status_code
+    except httpx.HTTPError as e:
+        return {'error': f'Error al conectar con el servicio: {str(e)}'}, 500
+
+@app.route('/api/proyecto/<int:project_id>/mensajes', methods=['GET'])
+@login_required
+@read_only
+async def obtener_mensajes_proyecto(project_id):
+    try:
+        # Forward the pagination cursors (?since=, ?before=) and page size
+        params = {key: request.args[key] for key in ('since', 'before', 'limit') if key in request.args}
+        response = await gateway.api.get(
+            f'/projects/{project_id}/messages',
+            params=params,
+            headers=auth_headers()
+        )
+        return response.json(), response.status_code
+    except httpx.HTTPError as e:
+        return {'error': f'Error al obtener mensajes: {str(e)}'}, 500
+
+@app.route('/api/mensaje', methods=['POST'])
+@login_required
+async def guardar_mensaje():
+    data = await request.get_json()
+    contenido = data.get('contenido')
+    es_bot = data.get('es_bot', False)
+    proyecto_id = data.get('proyecto_id')
+
+    if not contenido or not proyecto_id:
+        return {'error': 'Contenido y proyecto son obligatorios'}, 400
+
+    try:
+        response = await gateway.api.post(
+            f'/projects/{proyecto_id}/messages',
+            json={'contenido': contenido, 'es_bot': es_bot},
+            headers=auth_headers(json=True)
+        )
+        if response.status_code == 201:
+            return {'success': True, 'message': 'Mensaje guardado correctamente',
+                    'mensaje': response.json()['messages'][0]}, 200
+        else:
+            return response.json(), response.status_code
+    except httpx.HTTPError as e:
+        return {'error': f'Error al guardar mensaje: {str(e)}'}, 500
+
+@app.route('/api/usuario/editar/<int:user_id>', methods=['PUT'])
+@login_required
+async def editar_usuario(user_id):
+    data = await request.get_json()
+
+    # Validate required data
+    required_fields = ['nombre', 'apellidos', 'correo', 'user']
+    missing_fields = [field for field in required_fields if field not in data]
+
+    if missing_fields:
+        return {'error': f'Faltan campos requeridos: {", ".join(missing_fields)}'}, 400
+
+    user_data = {
+        'nombre': data.get('nombre'),
+        'apellidos': data.get('apellidos'),
+        'correo': data.get('correo'),
+        'username': data.get('user')  # mapping 'user' to 'username' for API
+    }
+
+    # Add password only if provided
+    if 'contrasena' in data and data['contrasena']:
+        user_data['password'] = data['contrasena']
+
+    try:
+        response = await gateway.api.put(f'/users/{user_id}', json=user_data, headers=auth_headers(json=True))
+        if response.status_code == 200:
+            invalidate_user(user_id)
+        return response.json(), response.status_code
+    except httpx.HTTPError as e:
+        return {'error': f'Error al conectar con el servicio: {str(e)}'}, 500
+
+@app.route('/api/usuario/eliminar/<int:user_id>', methods=['DELETE'])
+@login_required
+async def eliminar_usuario(user_id):
+    try:
+        response = await gateway.api.delete(f'/users/{user_id}', headers=auth_headers(json=True))
+        if response.status_code == 200:
+            invalidate_user(user_id)
+            return {'success': 'Usuario eliminado correctamente'}, 200
+        else:
+            return response.json(), response.status_code
+    except httpx.HTTPError as e:
+        return {'error': f'Error al conectar con el servicio: {str(e)}'}, 500
+
+@app.route('/api/usuario/<int:user_id>', methods=['GET'])
+@login_required
+@read_only
+async def obtener_usuario(user_id):
+    try:
+        response = await gateway.api.get(f'/users/{user_id}', headers=auth_headers())
+        if response.status_code == 200:
+            user_data = response.json().get('user', {})
+            # Adapt field names for frontend compatibility
+            return {
+                'id': user_data.get('id'),
+                'nombre': user_data.get('nombre'),
+                'apellidos': user_data.get('apellidos'),
+                'correo': user_data.get('correo'),
+                'user': user_data.get('username'),  # map 'username' to 'user' for frontend
+                'is_admin': user_data.get('is_admin')
+            }, 200
+        else:
+            return response.json(), response.status_code
+    except httpx.HTTPError as e:
+        return {'error': f'Error al conectar con el servicio: {str(e)}'}, 500
+
+@app.route('/api/gateway/stats', methods=['GET'])
+@login_required
+async def gateway_stats():
+    # For admins only, so it waits for the identity
+    if not g.current_user.is_admin:
+        return {'error': 'Acceso denegado'}, 403
+    return {
+        'upstreams': gateway.stats(),
+        'user_cache': user_cache.stats(),
+        'project_cache': project_cache.stats(),
+        'sessions': session_store.stats() if session_store is not None else None
+    }, 200
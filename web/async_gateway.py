@@ -0,0 +1,248 @@
+import asyncio
+import contextlib
+import time
+
+import httpx
+
+from services.instrumentation import propagation_headers, record_span, path_template
+from web.gateway import (
+    API_URL,
+    CHAT_URL,
+    CHAT_HEADERS,
+    DB_STICKY_HEADER,
+    POOL_SIZE,
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    RETRY_ATTEMPTS,
+    RETRY_STATUSES,
+    CircuitBreaker,
+    PoolCounters,
+    RetryBudget,
+    ValidatorCache,
+    coalesces,
+    create_breaker,
+    create_retry_budget,
+    is_failure,
+    page_params,
+    pool_setting,
+    remember_sticky,
+    retry_delay,
+    sticky_headers,
+)
+from web.single_flight import AsyncSingleFlight
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """
+    httpx counterpart of gateway.CircuitOpenError, so callers catching
+    httpx.HTTPError also handle an open circuit
+    """
+
+    def __init__(self, upstream):
+        super().__init__(f'El servicio {upstream} no está disponible temporalmente')
+        self.upstream = upstream
+
+
+def caller_session():
+    """
+    Session of the Quart request being served, or None outside of one
+    """
+    from quart import has_request_context, session
+    return session if has_request_context() else None
+
+
+class AsyncUpstreamPool:
+    """
+    Async counterpart of gateway.UpstreamPool, backed by an httpx.AsyncClient,
+    with the same circuit breaker and retry budget.
+
+    The client is created on first use so that it is bound to the event loop
+    of the server that runs the ASGI app.
+    """
+
+    def __init__(self, name, base_url, pool_size=POOL_SIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, headers=None,
+                 validators=None, breaker=None, retry_budget=None, retry_attempts=RETRY_ATTEMPTS,
+                 single_flight=None, sticky_reads=False):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.headers = headers or {}
+        self.validators = validators
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.retry_attempts = retry_attempts
+        self.single_flight = single_flight
+        self.sticky_reads = sticky_reads
+        self.counters = PoolCounters()
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+        return self._client
+
+    async def request(self, method, path, **kwargs):
+        kwargs['headers'] = propagation_headers(kwargs.get('headers'))
+        session = caller_session() if self.sticky_reads else None
+        if session is not None:
+            kwargs['headers'] = sticky_headers(session, kwargs['headers'])
+
+        if (self.single_flight is not None and method == 'GET'
+                and DB_STICKY_HEADER not in (kwargs['headers'] or {})):
+            key = ValidatorCache.key(path, kwargs.get('params'), kwargs.get('headers'))
+            return await self.single_flight.do(key, lambda: self._request(method, path, **kwargs))
+        response = await self._request(method, path, **kwargs)
+        if session is not None:
+            remember_sticky(session, response)
+        return response
+
+    async def _request(self, method, path, **kwargs):
+        conditional = self.validators is not None and method == 'GET'
+        if conditional:
+            key = ValidatorCache.key(path, kwargs.get('params'), kwargs.get('headers'))
+            cached, kwargs['headers'] = self.validators.conditional_headers(key, kwargs.get('headers'))
+
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(method, path, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if not (method == 'GET' and self._may_retry(attempt)):
+                    raise
+            else:
+                if not (method == 'GET' and response.status_code in RETRY_STATUSES
+                        and is_failure(response) and self._may_retry(attempt)):
+                    break
+            await asyncio.sleep(retry_delay(attempt))
+            attempt += 1
+
+        if conditional:
+            response = self.validators.resolve(key, response, cached)
+        return response
+
+    def _may_retry(self, attempt):
+        return attempt < self.retry_attempts and self.retry_budget.withdraw()
+
+    def _admit(self):
+        admitted = self.breaker.admit()
+        if admitted is None:
+            raise CircuitOpenError(self.name)
+        return admitted
+
+    async def _send(self, method, path, **kwargs):
+        admitted = self._admit()
+        start = time.perf_counter()
+        span = f'{self.name} {method} {path_template(path)}'
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            elapsed = time.perf_counter() - start
+            self.counters.record(elapsed, error=True)
+            record_span('upstream', span, elapsed * 1000)
+            self.breaker.record(admitted, failed=True)
+            raise
+        elapsed = time.perf_counter() - start
+        self.counters.record(elapsed, status_code=response.status_code)
+        record_span('upstream', span, elapsed * 1000)
+        self.breaker.record(admitted, failed=is_failure(response))
+        return response
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request('DELETE', path, **kwargs)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, path, **kwargs):
+        """
+        Async context manager yielding a streaming response.
+        The breaker judges the call by its status; it is never retried.
+        """
+        admitted = self._admit()
+        kwargs['headers'] = propagation_headers(kwargs.get('headers'))
+        try:
+            async with self.client.stream(method, path, **kwargs) as response:
+                self.breaker.record(admitted, failed=is_failure(response))
+                admitted = None
+                yield response
+        except httpx.HTTPError:
+            if admitted is not None:
+                self.breaker.record(admitted, failed=True)
+            raise
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        counters = self.counters.snapshot()
+        counters['base_url'] = self.base_url
+        counters['pool_size'] = self.pool_size
+        counters['breaker'] = self.breaker.stats()
+        counters['retry_budget'] = self.retry_budget.stats()
+        if self.single_flight is not None:
+            counters['single_flight'] = self.single_flight.stats()
+        if self.validators is not None:
+            counters['validator_cache'] = self.validators.stats()
+        return counters
+
+
+def create_pool(name, base_url, headers=None, conditional=False, sticky_reads=False):
+    return AsyncUpstreamPool(
+        name,
+        base_url,
+        pool_size=int(pool_setting(name, 'POOL_SIZE', POOL_SIZE)),
+        connect_timeout=float(pool_setting(name, 'CONNECT_TIMEOUT', CONNECT_TIMEOUT)),
+        read_timeout=float(pool_setting(name, 'READ_TIMEOUT', READ_TIMEOUT)),
+        headers=headers,
+        validators=ValidatorCache() if conditional else None,
+        breaker=create_breaker(name),
+        retry_budget=create_retry_budget(name),
+        retry_attempts=int(pool_setting(name, 'RETRY_ATTEMPTS', RETRY_ATTEMPTS)),
+        single_flight=AsyncSingleFlight() if coalesces(name) else None,
+        sticky_reads=sticky_reads,
+    )
+
+
+# Shared pools, one per upstream microservice
+api = create_pool('api', API_URL, conditional=True, sticky_reads=True)
+chat = create_pool('chat', CHAT_URL, headers=CHAT_HEADERS)
+
+pools = {pool.name: pool for pool in (api, chat)}
+
+
+async def get_page(pool, path, key, cursor=None, params=None, **kwargs):
+    """
+    Async version of gateway.get_page
+    """
+    response = await pool.get(path, params=page_params(params, cursor), **kwargs)
+    if response.status_code != 200:
+        return response, [], None
+    data = response.json()
+    return response, data.get(key, []), data.get('next_cursor')
+
+
+async def close():
+    for pool in pools.values():
+        await pool.aclose()
+
+
+def stats():
+    return {name: pool.stats() for name, pool in pools.items()}
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+
+import jwt
+
+from web.cache import TTLCache, token_fingerprint
+from web.models.user import User
+
+# Local JWT verification (the key must match the API's SECRET_KEY)
+LOCAL_JWT_VERIFICATION = os.environ.get('LOCAL_JWT_VERIFICATION', 'false').lower() in ('1', 'true', 'yes')
+JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key')
+JWT_ALGORITHMS = os.environ.get('JWT_ALGORITHMS', 'HS256').split(',')
+# Claims older than this (seconds since the token was issued) are not trusted for identity
+JWT_CLAIMS_MAX_AGE = float(os.environ.get('JWT_CLAIMS_MAX_AGE', 900))
+
+# Profile claim added by the API's LoginResource
+PROFILE_CLAIM = 'usr'
+
+# Profile kept in server-side sessions, trusted for this many seconds after it was loaded
+SESSION_PROFILE_KEY = 'user_profile'
+SESSION_PROFILE_MAX_AGE = float(os.environ.get('SESSION_PROFILE_MAX_AGE', 300))
+
+# Without a store shared by the workers (SESSION_BACKEND=sqlite), a change to a user
+# is only seen by the worker that made it, so the others trust cached data for less time
+UNSHARED_MAX_AGE = float(os.environ.get('USER_UNSHARED_MAX_AGE', 60))
+
+_stale_since = {}
+_stale_lock = threading.Lock()
+_stale_store = None
+
+# Short-lived cache of authenticated users, keyed by (user id, token fingerprint)
+user_cache = TTLCache(
+    maxsize=int(os.environ.get('USER_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('USER_CACHE_TTL', 30))
+)
+
+
+def user_cache_key(user_id, token):
+    return (str(user_id), token_fingerprint(token))
+
+
+def invalidate_user(user_id):
+    """
+    Drops every cached copy of a user, whatever token it was loaded with
+    """
+    user_cache.delete_where(lambda key: key[0] == str(user_id))
+    mark_stale(user_id)
+
+
+class InvalidToken(Exception):
+    """
+    Raised when a token fails signature or expiry verification
+    """
+
+
+def verify_token(token):
+    """
+    Verifies the signature and expiry of a Praetorian JWT and returns its claims
+    """
+    try:
+        return jwt.decode(
+            token,
+            JWT_SECRET_KEY,
+            algorithms=JWT_ALGORITHMS,
+            options={'require': ['exp', 'iat', 'id']}
+        )
+    except jwt.InvalidTokenError as e:
+        raise InvalidToken(str(e))
+
+
+def share_stale_markers(store):
+    """
+    Keeps the stale markers in the session store when every worker shares it
+    """
+    global _stale_store
+    _stale_store = store if getattr(store, 'shared', False) else None
+
+
+def mark_stale(user_id):
+    """
+    Claims issued for this user before now no longer describe them (profile edited or user deleted)
+    """
+    now = time.time()
+    with _stale_lock:
+        _stale_since[str(user_id)] = now
+    if _stale_store is not None:
+        _stale_store.mark_stale(user_id, now)
+
+
+def is_fresh(user_id, loaded_at, max_age):
+    """
+    Whether user data loaded at `loaded_at` is recent enough and predates no later change of the user
+    """
+    if _stale_store is None:
+        max_age = min(max_age, UNSHARED_MAX_AGE)
+    if time.time() - loaded_at > max_age:
+        return False
+    with _stale_lock:
+        stale_since = _stale_since.get(str(user_id), 0)
+    if _stale_store is not None:
+        stale_since = max(stale_since, _stale_store.stale_since(user_id))
+    return loaded_at > stale_since
+
+
+def user_from_claims(claims, user_id):
+    """
+    Rebuilds the web User from verified claims.
+    Returns None when the claims can't be used and the API must be asked instead.
+    """
+    if str(claims.get('id')) != str(user_id):
+        return None
+
+    profile = claims.get(PROFILE_CLAIM)
+    if not profile:
+        return None
+
+    if not is_fresh(user_id, claims['iat'], JWT_CLAIMS_MAX_AGE):
+        return None
+
+    roles = [role for role in claims.get('rls', '').split(',') if role]
+    return User(
+        id=claims['id'],
+        username=profile.get('username'),
+        correo=profile.get('correo'),
+        nombre=profile.get('nombre'),
+        apellidos=profile.get('apellidos'),
+        is_admin='admin' in roles,
+        roles=roles
+    )
+
+
+def user_from_token(token, user_id):
+    """
+    Local identity check: verifies the token and rebuilds the user from it.
+    Returns None when the API must be asked, raises InvalidToken if the token is not valid.
+    """
+    return user_from_claims(verify_token(token), user_id)
+
+
+def store_profile(session, user_data):
+    """
+    Keeps the API's user data in the session, if the session lives server-side
+    """
+    if getattr(session, 'server_side', False):
+        session[SESSION_PROFILE_KEY] = {'user': user_data, 'loaded_at': time.time()}
+
+
+def user_from_profile(session, user_id):
+    """
+    Rebuilds the user from the profile stored in the session.
+    Returns None when there is none or it is too old.
+    """
+    entry = session.get(SESSION_PROFILE_KEY)
+    if not entry or str(entry['user'].get('id')) != str(user_id):
+        return None
+    if not is_fresh(user_id, entry['loaded_at'], SESSION_PROFILE_MAX_AGE):
+        return None
+    return User.from_api_data(entry['user'])
@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from web.single_flight import AsyncSingleFlight, SingleFlight
+
+
+class TTLCache:
+    """
+    Thread-safe cache with a per-entry time to live and a bounded size.
+    When full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def delete_where(self, predicate):
+        """
+        Removes every entry whose key matches the predicate
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            self._counters['invalidations'] += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters['size'] = len(self._data)
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = counters['hits'] / lookups if lookups else 0.0
+        counters['maxsize'] = self.maxsize
+        counters['ttl'] = self.ttl
+        return counters
+
+
+class LoadTicket:
+    """
+    Identifies one load of a StaleWhileRevalidateCache key
+    """
+
+    __slots__ = ('created_at',)
+
+    def __init__(self):
+        self.created_at = time.time()
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache whose entries are fresh for `ttl` seconds after they were loaded.
+    After that, and up to `max_stale` seconds, they are still returned at
+    once while a background thread reloads them; only missing or older
+    entries make the caller wait for the loader. If a reload fails, the old
+    value keeps being served until it reaches max_stale.
+
+    Callers that miss a key while it is loading wait for that load instead
+    of starting another one. Loads run outside any request, so loaders must
+    not rely on request state. Invalidating a key also discards the result of a load that was
+    already running for it, so an old list can't be written back.
+
+    aget()/aprefetch() are the asyncio flavour, for the ASGI variant of the web.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0, max_stale=600.0, workers=2):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.workers = workers
+        self._data = OrderedDict()  # key -> (loaded_at, value); wall clock, comparable across processes
+        self._loading = {}  # key -> ticket of the load whose result will be kept
+        self._flight = SingleFlight()  # Keyed by ticket, so only one load runs per ticket
+        self._aflight = AsyncSingleFlight()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._tasks = set()
+        self._counters = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'invalidations': 0,
+        }
+
+    @property
+    def executor(self):
+        # Threads don't survive fork(), so each process starts its own
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cache-refresh')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def get(self, key, loader, not_before=None):
+        """
+        Returns the value for key, calling loader() if there is none usable.
+        Entries loaded before not_before (a time.time() value) are ignored.
+        """
+        value, ticket, missing = self._lookup(key, not_before)
+        if ticket is None:
+            return value
+        if missing:
+            return self._load(key, loader, ticket)
+        self.executor.submit(self._refresh, key, loader, ticket)
+        return value
+
+    async def aget(self, key, loader, not_before=None):
+        """
+        Same as get() for asyncio code: loader is a coroutine function and
+        background reloads run as tasks on the running event loop
+        """
+        value, ticket, missing = self._lookup(key, not_before)
+        if ticket is None:
+            return value
+        if missing:
+            return await self._aload(key, loader, ticket)
+        self._spawn(self._arefresh(key, loader, ticket))
+        return value
+
+    def prefetch(self, key, loader):
+        """
+        Loads key in the background unless it is already cached or loading
+        """
+        ticket = self._reserve(key)
+        if ticket is not None:
+            self.executor.submit(self._refresh, key, loader, ticket)
+
+    def aprefetch(self, key, loader):
+        """
+        prefetch() with a coroutine function, run as a task on the event loop
+        """
+        ticket = self._reserve(key)
+        if ticket is not None:
+            self._spawn(self._arefresh(key, loader, ticket))
+
+    def _lookup(self, key, not_before):
+        """
+        Returns (value, ticket, missing). A ticket means the caller must
+        load the key: before answering when missing, in the background otherwise.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (now - entry[0] > self.max_stale or (not_before and entry[0] < not_before)):
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                # Join the load in flight unless it started before not_before
+                ticket = self._loading.get(key)
+                if ticket is None or (not_before and ticket.created_at < not_before):
+                    ticket = self._loading[key] = LoadTicket()
+                return None, ticket, True
+            self._data.move_to_end(key)
+            loaded_at, value = entry
+            if now - loaded_at <= self.ttl:
+                self._counters['hits'] += 1
+                return value, None, False
+            self._counters['stale_hits'] += 1
+            if key in self._loading:
+                return value, None, False
+            ticket = self._loading[key] = LoadTicket()
+            return value, ticket, False
+
+    def _reserve(self, key):
+        with self._lock:
+            if key in self._data or key in self._loading:
+                return None
+            ticket = self._loading[key] = LoadTicket()
+            return ticket
+
+    def _spawn(self, coroutine):
+        # The loop only keeps weak references to tasks
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _load(self, key, loader, ticket):
+        return self._flight.do(ticket, lambda: self._run(key, loader, ticket))
+
+    async def _aload(self, key, loader, ticket):
+        return await self._aflight.do(ticket, lambda: self._arun(key, loader, ticket))
+
+    def _run(self, key, loader, ticket):
+        started_at = time.time()
+        try:
+            value = loader()
+        except BaseException:
+            self._release(key, ticket)
+            raise
+        self._store(key, ticket, started_at, value)
+        return value
+
+    async def _arun(self, key, loader, ticket):
+        started_at = time.time()
+        try:
+            value = await loader()
+        except BaseException:
+            self._release(key, ticket)
+            raise
+        self._store(key, ticket, started_at, value)
+        return value
+
+    def _release(self, key, ticket):
+        with self._lock:
+            if self._loading.get(key) is ticket:
+                del self._loading[key]
+
+    def _store(self, key, ticket, started_at, value):
+        with self._lock:
+            if self._loading.get(key) is ticket:
+                del self._loading[key]
+                # Stamped with the start of the load: the data is no newer than that
+                self._data[key] = (started_at, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def _loads(self, key, ticket):
+        # A caller that missed may have run the load before the background one started
+        with self._lock:
+            return self._loading.get(key) is ticket
+
+    def _refresh(self, key, loader, ticket):
+        if not self._loads(key, ticket):
+            return
+        try:
+            self._load(key, loader, ticket)
+        except Exception:
+            self._count('refresh_errors')
+        else:
+            self._count('refreshes')
+
+    async def _arefresh(self, key, loader, ticket):
+        if not self._loads(key, ticket):
+            return
+        try:
+            await self._aload(key, loader, ticket)
+        except Exception:
+            self._count('refresh_errors')
+        else:
+            self._count('refreshes')
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._loading.pop(key, None)
+            if self._data.pop(key, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def invalidate_where(self, predicate):
+        """
+        Removes every entry for which predicate(key, value) is true
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+                self._loading.pop(key, None)
+            self._counters['invalidations'] += len(keys)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters['size'] = len(self._data)
+            counters['loading'] = len(self._loading)
+        counters['shared_loads'] = self._flight.shared + self._aflight.shared
+        lookups = counters['hits'] + counters['stale_hits'] + counters['misses']
+        counters['hit_ratio'] = (counters['hits'] + counters['stale_hits']) / lookups if lookups else 0.0
+        counters['maxsize'] = self.maxsize
+        counters['ttl'] = self.ttl
+        counters['max_stale'] = self.max_stale
+        return counters
+
+
+def token_fingerprint(token):
+    """
+    Short, non-reversible identifier of a JWT, safe to use as a cache key
+    """
+    if not token:
+        return None
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
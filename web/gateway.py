@@ -0,0 +1,621 @@
+import collections
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.instrumentation import propagation_headers, record_span, path_template
+from web.cache import TTLCache, token_fingerprint
+from web.single_flight import SingleFlight
+
+# URLs for microservices
+API_URL = os.environ.get('API_URL', 'http://localhost:5001')  # Projects and users API
+CHAT_URL = os.environ.get('CHAT_URL', 'http://localhost:5002')  # Chat microservice
+
+# Pool configuration, shared by every upstream unless overridden per service
+POOL_SIZE = int(os.environ.get('GATEWAY_POOL_SIZE', 20))
+CONNECT_TIMEOUT = float(os.environ.get('GATEWAY_CONNECT_TIMEOUT', 2.0))
+READ_TIMEOUT = float(os.environ.get('GATEWAY_READ_TIMEOUT', 10.0))
+
+# Responses kept for conditional revalidation (If-None-Match)
+VALIDATOR_CACHE_SIZE = int(os.environ.get('GATEWAY_VALIDATOR_CACHE_SIZE', 256))
+VALIDATOR_CACHE_TTL = float(os.environ.get('GATEWAY_VALIDATOR_CACHE_TTL', 300))
+
+# Circuit breaker: opens when, over the last BREAKER_WINDOW seconds, at least
+# BREAKER_MIN_REQUESTS calls were made and BREAKER_FAILURE_RATE of them failed
+BREAKER_WINDOW = float(os.environ.get('GATEWAY_BREAKER_WINDOW', 30))
+BREAKER_MIN_REQUESTS = int(os.environ.get('GATEWAY_BREAKER_MIN_REQUESTS', 20))
+BREAKER_FAILURE_RATE = float(os.environ.get('GATEWAY_BREAKER_FAILURE_RATE', 0.5))
+BREAKER_OPEN_SECONDS = float(os.environ.get('GATEWAY_BREAKER_OPEN_SECONDS', 15))
+
+# Retries of GET requests after connection errors and 502/503/504 responses
+RETRY_ATTEMPTS = int(os.environ.get('GATEWAY_RETRY_ATTEMPTS', 2))
+RETRY_BUDGET_RATIO = float(os.environ.get('GATEWAY_RETRY_BUDGET_RATIO', 0.1))
+RETRY_BUDGET_MAX = float(os.environ.get('GATEWAY_RETRY_BUDGET_MAX', 10))
+RETRY_BACKOFF = float(os.environ.get('GATEWAY_RETRY_BACKOFF', 0.05))
+RETRY_BACKOFF_MAX = float(os.environ.get('GATEWAY_RETRY_BACKOFF_MAX', 1.0))
+RETRY_STATUSES = (502, 503, 504)
+
+# Read-your-writes across the API's read replica: responses to writes carry
+# the time until which the caller must read from the primary. It is kept in
+# the user's session, which every web worker sees, and sent back to the API.
+DB_STICKY_HEADER = 'X-DB-Sticky-Until'
+SESSION_STICKY_KEY = 'db_sticky_until'
+# Longest stickiness accepted back from the browser (see relay_sticky)
+DB_STICKY_SECONDS = float(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+# Items per page of the lists rendered by the web (users, projects)
+LIST_PAGE_SIZE = int(os.environ.get('GATEWAY_LIST_PAGE_SIZE', 50))
+
+# Identical concurrent GETs (same path, query and caller) share one upstream call
+COALESCE_REQUESTS = os.environ.get('GATEWAY_COALESCE_REQUESTS', 'true').lower() in ('1', 'true', 'yes')
+
+
+class PoolCounters:
+    """
+    Thread-safe request/status/latency counters of an upstream pool
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0,
+            'errors': 0,
+            'responses_2xx': 0,
+            'responses_3xx': 0,
+            'responses_4xx': 0,
+            'responses_5xx': 0,
+            'total_time': 0.0,
+        }
+
+    def record(self, elapsed, status_code=None, error=False):
+        with self._lock:
+            self._counters['requests'] += 1
+            self._counters['total_time'] += elapsed
+            if error:
+                self._counters['errors'] += 1
+            else:
+                key = f'responses_{status_code // 100}xx'
+                self._counters[key] = self._counters.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+        counters['avg_time'] = counters['total_time'] / counters['requests'] if counters['requests'] else 0.0
+        return counters
+
+
+class ValidatorCache:
+    """
+    Small cache of GET responses that carry an ETag, keyed by path, query
+    and caller. Cached entries are revalidated with If-None-Match, so an
+    unchanged resource costs a 304 instead of a full query and payload.
+    """
+
+    def __init__(self, maxsize=VALIDATOR_CACHE_SIZE, ttl=VALIDATOR_CACHE_TTL):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.not_modified = 0
+
+    @staticmethod
+    def key(path, params=None, headers=None):
+        principal = token_fingerprint((headers or {}).get('Authorization'))
+        return (path, tuple(sorted((params or {}).items())), principal)
+
+    def conditional_headers(self, key, headers):
+        """
+        Returns the cached response for the key (or None) and the request
+        headers extended with its validator
+        """
+        cached = self.entries.get(key)
+        if cached is None:
+            return None, headers
+        return cached, {**(headers or {}), 'If-None-Match': cached.headers['ETag']}
+
+    def resolve(self, key, response, cached):
+        if response.status_code == 304 and cached is not None:
+            with self._lock:
+                self.not_modified += 1
+            return cached
+        if response.status_code == 200 and response.headers.get('ETag'):
+            self.entries.set(key, response)
+        elif cached is not None:
+            self.entries.delete(key)
+        return response
+
+    def stats(self):
+        counters = self.entries.stats()
+        counters['not_modified'] = self.not_modified
+        return counters
+
+
+def sticky_headers(session, headers):
+    """
+    Request headers extended with the session's sticky-until time while it lasts
+    """
+    until = session.get(SESSION_STICKY_KEY)
+    if until is None:
+        return headers
+    if until <= time.time():
+        session.pop(SESSION_STICKY_KEY, None)
+        return headers
+    return {**(headers or {}), DB_STICKY_HEADER: f'{until:.3f}'}
+
+
+def remember_sticky(session, response):
+    until = sticky_until(response)
+    if until is not None:
+        session[SESSION_STICKY_KEY] = until
+
+
+def relay_sticky(session, value):
+    """
+    Keeps a sticky-until time the browser sends back. Writes made after a
+    streamed response has left the request can't reach the session, so the
+    time travels to the browser in the stream and returns on its next
+    request. Capped, so a client can't pin itself to the primary for longer
+    than one write would.
+    """
+    try:
+        until = min(float(value), time.time() + DB_STICKY_SECONDS)
+    except (TypeError, ValueError):
+        return
+    if until > session.get(SESSION_STICKY_KEY, 0):
+        session[SESSION_STICKY_KEY] = until
+
+
+def sticky_until(response):
+    """
+    Sticky-until time of an API response, or None
+    """
+    try:
+        return float(response.headers[DB_STICKY_HEADER])
+    except (KeyError, ValueError):
+        return None
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised without calling the upstream while its circuit breaker is open
+    """
+
+    def __init__(self, upstream):
+        super().__init__(f'El servicio {upstream} no está disponible temporalmente')
+        self.upstream = upstream
+
+
+def is_failure(response):
+    """
+    Whether an upstream response counts against its circuit breaker.
+    A 503 with Retry-After is the upstream shedding load on purpose
+    (e.g. the API's password hashing pool), not a failing upstream.
+    """
+    if response.status_code < 500:
+        return False
+    return not (response.status_code == 503 and 'Retry-After' in response.headers)
+
+
+def retry_delay(attempt):
+    """
+    Exponential backoff with full jitter, so retries from many workers don't line up
+    """
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker of an upstream.
+
+    Closed: calls go through and their outcomes are counted in one-second
+    buckets covering the last `window` seconds. Once the window holds at
+    least min_requests calls and failure_rate of them failed, it opens.
+    Open: calls are refused for open_seconds, without reaching the upstream.
+    Half-open: a single trial call goes through; its success closes the
+    breaker and its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window=BREAKER_WINDOW, min_requests=BREAKER_MIN_REQUESTS,
+                 failure_rate=BREAKER_FAILURE_RATE, open_seconds=BREAKER_OPEN_SECONDS):
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._buckets = collections.deque()  # [second, calls, failures]
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def _totals(self, now):
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+        calls = sum(bucket[1] for bucket in self._buckets)
+        failures = sum(bucket[2] for bucket in self._buckets)
+        return calls, failures
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self.times_opened += 1
+
+    def admit(self):
+        """
+        Returns None if the call must be refused, or the state it was
+        admitted in, to be passed back to record()
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return None
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                # A trial call that never reported back stops blocking after open_seconds
+                now = time.monotonic()
+                if self._probing and now - self._probe_started < self.open_seconds:
+                    self.rejected += 1
+                    return None
+                self._probing = True
+                self._probe_started = now
+            return self.state
+
+    def record(self, admitted, failed):
+        with self._lock:
+            if admitted == self.HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._probing = False
+                    self._buckets.clear()
+                return
+            if self.state != self.CLOSED:
+                # Late outcome of a call admitted before the breaker opened
+                return
+
+            now = int(time.monotonic())
+            if not self._buckets or self._buckets[-1][0] != now:
+                self._buckets.append([now, 0, 0])
+            self._buckets[-1][1] += 1
+            self._buckets[-1][2] += int(failed)
+
+            calls, failures = self._totals(now)
+            if calls >= self.min_requests and failures / calls >= self.failure_rate:
+                self._open()
+
+    def stats(self):
+        with self._lock:
+            calls, failures = self._totals(int(time.monotonic()))
+            return {
+                'state': self.state,
+                'window_calls': calls,
+                'window_failures': failures,
+                'failure_rate': failures / calls if calls else 0.0,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+            }
+
+
+class RetryBudget:
+    """
+    Token bucket that keeps retries to a fraction of the traffic: each
+    request deposits `ratio` tokens (up to `capacity`) and each retry
+    spends one. When an upstream fails for everyone, retries stop once
+    the budget is spent instead of multiplying the load on it.
+    """
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, capacity=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                self.exhausted += 1
+                return False
+            self.tokens -= 1
+            self.retries += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {'tokens': self.tokens, 'retries': self.retries, 'exhausted': self.exhausted}
+
+
+def caller_session():
+    """
+    Session of the Flask request being served, or None outside of one
+    (e.g. in background refreshes)
+    """
+    from flask import has_request_context, session
+    return session if has_request_context() else None
+
+
+class UpstreamPool:
+    """
+    Keep-alive HTTP connection pool for a single upstream microservice.
+
+    All requests share one requests.Session, so TCP connections to the
+    upstream are reused instead of being opened on every call. Calls go
+    through the upstream's circuit breaker, and GETs that hit a connection
+    error or a 502/503/504 are retried while the retry budget allows.
+    Identical concurrent GETs are coalesced into one call (single_flight).
+    """
+
+    def __init__(self, name, base_url, pool_size=POOL_SIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, headers=None,
+                 validators=None, breaker=None, retry_budget=None, retry_attempts=RETRY_ATTEMPTS,
+                 single_flight=None, sticky_reads=False):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.validators = validators
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.retry_attempts = retry_attempts
+        self.single_flight = single_flight
+        self.sticky_reads = sticky_reads
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self.counters = PoolCounters()
+        self.transport = 'http'
+
+    def mount_app(self, wsgi_app):
+        """
+        Serves this upstream with a WSGI app in the same process instead of over HTTP
+        """
+        from web.inprocess import WSGIAdapter
+        self.session.mount(self.base_url, WSGIAdapter(wsgi_app))
+        self.transport = 'in-process'
+
+    def url(self, path):
+        return f'{self.base_url}{path}'
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request to the upstream through the shared session.
+        Connect/read timeouts are applied unless the caller passes its own.
+        Raises CircuitOpenError while the upstream's breaker is open.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs['headers'] = propagation_headers(kwargs.get('headers'))
+        session = caller_session() if self.sticky_reads else None
+        if session is not None:
+            kwargs['headers'] = sticky_headers(session, kwargs['headers'])
+
+        # The response is fully read, so callers can share it like the validator cache does.
+        # Reads pinned to the primary aren't shared with callers that may use the replica.
+        if (self.single_flight is not None and method == 'GET' and not kwargs.get('stream')
+                and DB_STICKY_HEADER not in (kwargs['headers'] or {})):
+            key = ValidatorCache.key(path, kwargs.get('params'), kwargs.get('headers'))
+            return self.single_flight.do(key, lambda: self._request(method, path, **kwargs))
+        response = self._request(method, path, **kwargs)
+        if session is not None:
+            remember_sticky(session, response)
+        return response
+
+    def _request(self, method, path, **kwargs):
+        conditional = self.validators is not None and method == 'GET' and not kwargs.get('stream')
+        if conditional:
+            key = ValidatorCache.key(path, kwargs.get('params'), kwargs.get('headers'))
+            cached, kwargs['headers'] = self.validators.conditional_headers(key, kwargs.get('headers'))
+
+        # Only GETs are retried: they are idempotent and not streamed
+        retryable = method == 'GET' and not kwargs.get('stream')
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = self._send(method, path, **kwargs)
+            except requests.ConnectionError:
+                if not (retryable and self._may_retry(attempt)):
+                    raise
+            else:
+                if not (retryable and response.status_code in RETRY_STATUSES
+                        and is_failure(response) and self._may_retry(attempt)):
+                    break
+                response.close()
+            time.sleep(retry_delay(attempt))
+            attempt += 1
+
+        if conditional:
+            response = self.validators.resolve(key, response, cached)
+        return response
+
+    def _may_retry(self, attempt):
+        return attempt < self.retry_attempts and self.retry_budget.withdraw()
+
+    def _send(self, method, path, **kwargs):
+        admitted = self.breaker.admit()
+        if admitted is None:
+            raise CircuitOpenError(self.name)
+
+        start = time.perf_counter()
+        span = f'{self.name} {method} {path_template(path)}'
+        try:
+            response = self.session.request(method, self.url(path), **kwargs)
+        except requests.RequestException:
+            elapsed = time.perf_counter() - start
+            self.counters.record(elapsed, error=True)
+            record_span('upstream', span, elapsed * 1000)
+            self.breaker.record(admitted, failed=True)
+            raise
+        elapsed = time.perf_counter() - start
+        self.counters.record(elapsed, status_code=response.status_code)
+        record_span('upstream', span, elapsed * 1000)
+        self.breaker.record(admitted, failed=is_failure(response))
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool counters
+        """
+        counters = self.counters.snapshot()
+        counters['base_url'] = self.base_url
+        counters['pool_size'] = self.pool_size
+        counters['transport'] = self.transport
+        counters['breaker'] = self.breaker.stats()
+        counters['retry_budget'] = self.retry_budget.stats()
+        if self.single_flight is not None:
+            counters['single_flight'] = self.single_flight.stats()
+        if self.validators is not None:
+            counters['validator_cache'] = self.validators.stats()
+        return counters
+
+
+def pool_setting(service, name, default):
+    """
+    Reads a per-service override such as GATEWAY_CHAT_POOL_SIZE
+    """
+    return os.environ.get(f'GATEWAY_{service.upper()}_{name}', default)
+
+
+def coalesces(name):
+    return str(pool_setting(name, 'COALESCE_REQUESTS', COALESCE_REQUESTS)).lower() in ('1', 'true', 'yes')
+
+
+def create_breaker(name):
+    return CircuitBreaker(
+        window=float(pool_setting(name, 'BREAKER_WINDOW', BREAKER_WINDOW)),
+        min_requests=int(pool_setting(name, 'BREAKER_MIN_REQUESTS', BREAKER_MIN_REQUESTS)),
+        failure_rate=float(pool_setting(name, 'BREAKER_FAILURE_RATE', BREAKER_FAILURE_RATE)),
+        open_seconds=float(pool_setting(name, 'BREAKER_OPEN_SECONDS', BREAKER_OPEN_SECONDS)),
+    )
+
+
+def create_retry_budget(name):
+    return RetryBudget(
+        ratio=float(pool_setting(name, 'RETRY_BUDGET_RATIO', RETRY_BUDGET_RATIO)),
+        capacity=float(pool_setting(name, 'RETRY_BUDGET_MAX', RETRY_BUDGET_MAX)),
+    )
+
+
+def create_pool(name, base_url, headers=None, conditional=False, sticky_reads=False):
+    return UpstreamPool(
+        name,
+        base_url,
+        pool_size=int(pool_setting(name, 'POOL_SIZE', POOL_SIZE)),
+        connect_timeout=float(pool_setting(name, 'CONNECT_TIMEOUT', CONNECT_TIMEOUT)),
+        read_timeout=float(pool_setting(name, 'READ_TIMEOUT', READ_TIMEOUT)),
+        headers=headers,
+        validators=ValidatorCache() if conditional else None,
+        breaker=create_breaker(name),
+        retry_budget=create_retry_budget(name),
+        retry_attempts=int(pool_setting(name, 'RETRY_ATTEMPTS', RETRY_ATTEMPTS)),
+        single_flight=SingleFlight() if coalesces(name) else None,
+        sticky_reads=sticky_reads,
+    )
+
+
+# The chat microservice authenticates its callers with an API key
+CHAT_HEADERS = {'X-API-Key': os.environ.get('CHAT_API_KEY', 'your-api-key')}
+
+# Shared pools, one per upstream microservice
+api = create_pool('api', API_URL, conditional=True, sticky_reads=True)  # API resources send ETags
+chat = create_pool('chat', CHAT_URL, headers=CHAT_HEADERS)
+
+pools = {pool.name: pool for pool in (api, chat)}
+
+
+def dispatch_in_process(apps):
+    """
+    Monolith mode: serves the named upstreams (e.g. {'api': api_app}) in-process
+    """
+    for name, wsgi_app in apps.items():
+        pools[name].mount_app(wsgi_app)
+
+
+def page_params(params=None, cursor=None):
+    params = {**(params or {}), 'limit': LIST_PAGE_SIZE}
+    if cursor:
+        params['cursor'] = cursor
+    return params
+
+
+def get_page(pool, path, key, cursor=None, params=None, **kwargs):
+    """
+    Fetches one page of a paginated list endpoint.
+    Returns the response (so callers can check its status code), the items
+    of the page and the cursor of the next one (None on the last page).
+    """
+    response = pool.get(path, params=page_params(params, cursor), **kwargs)
+    if response.status_code != 200:
+        return response, [], None
+    data = response.json()
+    return response, data.get(key, []), data.get('next_cursor')
+
+
+class SSEParser:
+    """
+    Incremental parser for Server-Sent Events relayed from an upstream.
+    Feed it raw chunks as they arrive; it returns the (event, data) pairs
+    completed so far, with data decoded from JSON.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+
+    def feed(self, chunk):
+        self._buffer += chunk.replace(b'\r\n', b'\n')
+        events = []
+        while b'\n\n' in self._buffer:
+            raw, self._buffer = self._buffer.split(b'\n\n', 1)
+            event, data = 'message', []
+            for line in raw.decode('utf-8').split('\n'):
+                if line.startswith('event:'):
+                    event = line[len('event:'):].strip()
+                elif line.startswith('data:'):
+                    data.append(line[len('data:'):].strip())
+            if data:
+                events.append((event, json.loads('\n'.join(data))))
+        return events
+
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def stats():
+    """
+    Returns the counters of every upstream pool, keyed by upstream name
+    """
+    return {name: pool.stats() for name, pool in pools.items()}
@@ -0,0 +1,127 @@
+"""
+In-process transport for the gateway (monolith mode).
+
+WSGIAdapter is a requests transport adapter that, instead of opening a
+connection, builds a WSGI environ from the outgoing request and calls a
+co-located WSGI app directly. Mounted on an UpstreamPool's session, the
+gateway code and everything it does (headers, validators, counters,
+streaming) stays the same as in the distributed deployment; only the
+loopback TCP hop disappears.
+"""
+import contextvars
+from urllib.parse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from werkzeug.test import EnvironBuilder
+
+
+class WSGIBody:
+    """
+    File-like view of a WSGI app_iter, read lazily so streamed responses
+    (e.g. Server-Sent Events) are relayed as the app produces them.
+
+    The app runs in its own copy of the caller's context, so its request
+    state (Flask contexts, traces) doesn't leak into the calling request.
+    """
+
+    def __init__(self, app_iter, context):
+        self._app_iter = app_iter
+        self._iterator = iter(app_iter)
+        self._context = context
+        self._buffer = b''
+        self._exhausted = False
+
+    def _next_chunk(self):
+        try:
+            return self._context.run(next, self._iterator)
+        except StopIteration:
+            self._exhausted = True
+            self.close()
+            return None
+
+    def prefetch(self):
+        chunk = self._next_chunk()
+        if chunk:
+            self._buffer += chunk
+
+    def stream(self, amt=None, decode_content=None):
+        if self._buffer:
+            chunk, self._buffer = self._buffer, b''
+            yield chunk
+        while not self._exhausted:
+            chunk = self._next_chunk()
+            if chunk:
+                yield chunk
+
+    def read(self, amt=None):
+        while not self._exhausted and (amt is None or len(self._buffer) < amt):
+            chunk = self._next_chunk()
+            if chunk:
+                self._buffer += chunk
+        if amt is None:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        close = getattr(self._app_iter, 'close', None)
+        if close is not None:
+            self._app_iter = None
+            self._context.run(close)
+
+
+class WSGIAdapter(BaseAdapter):
+    """
+    requests adapter that serves requests with a WSGI app in this process.
+    Timeouts, TLS and proxy settings don't apply and are ignored.
+    """
+
+    def __init__(self, app):
+        super().__init__()
+        self.app = app
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        url = urlsplit(request.url)
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        environ = EnvironBuilder(
+            path=url.path,
+            query_string=url.query,
+            method=request.method,
+            base_url=f'{url.scheme}://{url.netloc}',
+            headers=list(request.headers.items()),
+            data=body or None,
+        ).get_environ()
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = status
+            started['headers'] = headers
+
+        context = contextvars.copy_context()
+        body = WSGIBody(context.run(self.app, environ, start_response), context)
+        if 'status' not in started:
+            # Apps may delay start_response until their first chunk
+            body.prefetch()
+
+        code, _, reason = started['status'].partition(' ')
+        response = Response()
+        response.status_code = int(code)
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(started['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,219 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+from web.cache import TTLCache
+
+# cookie (Flask's signed cookie), memory (this process) or sqlite (shared by the workers of a host)
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cookie').lower()
+SESSION_MEMORY_SIZE = int(os.environ.get('SESSION_MEMORY_SIZE', 10000))
+SESSION_SQLITE_PATH = os.environ.get('SESSION_SQLITE_PATH', 'web_sessions.db')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """
+    Session whose data lives in a SessionStore; the cookie only carries its id
+    """
+
+    server_side = True
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """
+        Moves the data to a fresh id (e.g. on login), so an id known before
+        authentication can't be reused afterwards
+        """
+        if self.previous_sid is None and not self.new:
+            self.previous_sid = self.sid
+        self.sid = new_session_id()
+        self.modified = True
+
+
+def new_session_id():
+    return secrets.token_urlsafe(32)
+
+
+class MemorySessionStore:
+    """
+    Sessions kept in this process. Only valid with a single worker.
+    """
+
+    shared = False
+
+    def __init__(self, maxsize=SESSION_MEMORY_SIZE):
+        self.cache = TTLCache(maxsize=maxsize)
+
+    def load(self, sid):
+        data = self.cache.get(sid)
+        return dict(data) if data is not None else None
+
+    def save(self, sid, data, ttl):
+        self.cache.set(sid, dict(data), ttl=ttl)
+
+    def delete(self, sid):
+        self.cache.delete(sid)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class SQLiteSessionStore:
+    """
+    Sessions in a SQLite file, shared by every worker of the host.
+    Stand-in for a shared store (e.g. Redis) with the same interface.
+    It also keeps the users whose cached identity went stale (see web.auth).
+    """
+
+    shared = True
+
+    # Expired rows are purged every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path=SESSION_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self.connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS stale_users (user_id TEXT PRIMARY KEY, since REAL NOT NULL)'
+            )
+
+    def connection(self):
+        # One connection per thread, rebuilt after fork()
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection = sqlite3.connect(self.path, timeout=5)
+            self._local.connection.execute('PRAGMA journal_mode=WAL')
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def load(self, sid):
+        row = self.connection().execute(
+            'SELECT data FROM sessions WHERE sid = ? AND expires_at > ?', (sid, time.time())
+        ).fetchone()
+        return session_json_serializer.loads(row[0]) if row else None
+
+    def save(self, sid, data, ttl):
+        with self.connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)',
+                (sid, session_json_serializer.dumps(dict(data)), time.time() + ttl)
+            )
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % self.PURGE_EVERY == 0
+            if purge:
+                connection.execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),))
+
+    def delete(self, sid):
+        with self.connection() as connection:
+            connection.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def mark_stale(self, user_id, since):
+        with self.connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO stale_users (user_id, since) VALUES (?, ?)', (str(user_id), since)
+            )
+
+    def stale_since(self, user_id):
+        row = self.connection().execute(
+            'SELECT since FROM stale_users WHERE user_id = ?', (str(user_id),)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def stats(self):
+        size = self.connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        return {'size': size, 'path': self.path}
+
+
+class ServerSideSessionMixin:
+    """
+    Cookie handling shared by the Flask and Quart session interfaces.
+    The cookie holds an opaque random id; the data stays in the store.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def _open(self, app, cookies):
+        sid = cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.load(sid)
+            if data is not None:
+                return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=new_session_id(), new=True)
+
+    def _save(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+            session.previous_sid = None
+
+        # If the session is modified to be empty, drop it and the cookie
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        self.store.save(session.sid, session, app.permanent_session_lifetime.total_seconds())
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+        response.vary.add('Cookie')
+
+
+class ServerSideSessionInterface(ServerSideSessionMixin, SessionInterface):
+    def open_session(self, app, request):
+        return self._open(app, request.cookies)
+
+    def save_session(self, app, session, response):
+        self._save(app, session, response)
+
+
+def create_session_store(backend=SESSION_BACKEND):
+    """
+    Returns the store for the configured backend, or None for signed cookies
+    """
+    if backend == 'cookie':
+        return None
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    raise ValueError(f'SESSION_BACKEND no válido: {backend}')
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls. The first caller for a key runs
+    the call; callers arriving while it is in flight wait for it and get
+    the same result (or exception) instead of calling the upstream again.
+    Nothing is kept once the call finishes: this is not a cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, function):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'calls': self.calls, 'shared': self.shared}
+
+
+class AsyncSingleFlight:
+    """
+    Async version of SingleFlight. The call runs as a task shared
+    by every caller with the same key, so one caller being cancelled
+    doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def _finished(self, key, task):
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved even if every caller was cancelled
+
+    async def do(self, key, coroutine_function):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(coroutine_function())
+            task.add_done_callback(lambda task: self._finished(key, task))
+            self.calls += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {'in_flight': len(self._calls), 'calls': self.calls, 'shared': self.shared}